@@ -0,0 +1,7 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite for pcombinators. Run with `python3 -m benchmarks --help`.
+
+@author: lbo
+"""
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Run benchmarks of the example grammars and compare results against a baseline.
+
+    PYTHONPATH=. python3 -m benchmarks run --output results.json
+    PYTHONPATH=. python3 -m benchmarks compare baseline.json results.json
+
+Every benchmark parses a generated input on both ParseState and ParseFileState
+and reports throughput, per-parse latency percentiles and peak memory.
+
+@author: lbo
+"""
+
+import argparse
+import io
+import json
+import math
+import platform
+import sys
+import time
+import tracemalloc
+
+import pcombinators.primitives as prim
+import pcombinators.state as st
+import pcombinators.tests.arith as arith
+import pcombinators.tests.csv as csv
+import pcombinators.tests.json as js
+
+import benchmarks.generators as gen
+
+def _parse_json(s):
+    return js.Value().parse(s)
+
+def _parse_csv(s):
+    return csv.file.parse(s)
+
+_arith = arith.Term().then_skip(prim.EndOfInput())
+
+def _parse_arith(s):
+    return _arith.parse(s)
+
+# name -> (parse function, input generator, size for default run, size for quick run)
+WORKLOADS = {
+    'json_flat': (_parse_json, gen.json_flat, 2000, 200),
+    'json_nested': (_parse_json, gen.json_nested, 7, 4),
+    'json_wide': (_parse_json, gen.json_wide, 200, 20),
+    'csv_narrow': (_parse_csv, gen.csv_narrow, 2000, 200),
+    'csv_wide': (_parse_csv, gen.csv_wide, 100, 10),
+    'csv_quoted': (_parse_csv, gen.csv_quoted, 500, 50),
+    'arith': (_parse_arith, gen.arith, 200, 20),
+}
+
+STATES = {
+    'ParseState': st.ParseState,
+    'ParseFileState': lambda s: st.ParseFileState(io.StringIO(s)),
+}
+
+def percentile(values, p):
+    """Return the p-th percentile (0..100) of a list of numbers, using nearest-rank."""
+    values = sorted(values)
+    k = max(0, min(len(values)-1, math.ceil(p / 100 * len(values)) - 1))
+    return values[k]
+
+def _check(result, state):
+    # A grammar stopping early would look like a speedup.
+    if result is None:
+        raise Exception('benchmark input failed to parse')
+    if not state.finished():
+        raise Exception('benchmark input was not parsed completely (stopped at {})'.format(state.index()))
+
+def measure(parse, make_state, text, repeat):
+    """Parse text `repeat` times and return a dict of statistics."""
+    latencies = []
+    for i in range(repeat):
+        state = make_state(text)
+        before = time.perf_counter()
+        result, state = parse(state)
+        latencies.append(time.perf_counter() - before)
+        _check(result, state)
+    # Memory is measured in a separate run, as tracing slows down parsing considerably.
+    # The state is created first, so that the copy of the input made by StringIO isn't
+    # counted for ParseFileState.
+    state = make_state(text)
+    tracemalloc.start()
+    result, state = parse(state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    _check(result, state)
+    total = sum(latencies)
+    return {
+        'input_chars': len(text),
+        'repeat': repeat,
+        'throughput_chars_per_s': len(text) * repeat / total,
+        'latency_p50_s': percentile(latencies, 50),
+        'latency_p90_s': percentile(latencies, 90),
+        'latency_p99_s': percentile(latencies, 99),
+        'peak_memory_bytes': peak,
+    }
+
+def run(args):
+    results = {}
+    for name, (parse, generate, size, quick_size) in WORKLOADS.items():
+        if args.filter and args.filter not in name:
+            continue
+        text = generate(quick_size if args.quick else size, seed=args.seed)
+        for state_name, make_state in STATES.items():
+            key = '{}/{}'.format(name, state_name)
+            results[key] = r = measure(parse, make_state, text, args.repeat)
+            print('{:<30} {:>12.0f} chars/s  p50 {:>9.2f} ms  p99 {:>9.2f} ms  peak {:>8.0f} KiB'.format(
+                key, r['throughput_chars_per_s'], r['latency_p50_s'] * 1e3,
+                r['latency_p99_s'] * 1e3, r['peak_memory_bytes'] / 1024))
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'quick': args.quick,
+            'time': time.time(),
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    return 0
+
+# metric -> True if larger is better
+METRICS = {
+    'throughput_chars_per_s': True,
+    'latency_p50_s': False,
+    'latency_p99_s': False,
+    'peak_memory_bytes': False,
+}
+
+def compare(args):
+    """Compare two result files; exit with status 1 if any metric regressed by more than the threshold."""
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+    with open(args.current) as f:
+        current = json.load(f)['results']
+    regressions = 0
+    for key in sorted(set(baseline) & set(current)):
+        if baseline[key]['input_chars'] != current[key]['input_chars']:
+            print('skipping {}: inputs differ (different seed or --quick?)'.format(key))
+            continue
+        for metric, larger_is_better in METRICS.items():
+            old, new = baseline[key][metric], current[key][metric]
+            if old == 0:
+                continue
+            change = (new - old) / old
+            regressed = -change > args.threshold if larger_is_better else change > args.threshold
+            if regressed:
+                regressions += 1
+            if regressed or args.verbose:
+                print('{} {:<30} {:<24} {:>14.6g} -> {:<14.6g} ({:+.1%})'.format(
+                    'REGRESSION' if regressed else '          ', key, metric, old, new, change))
+    for key in sorted(set(baseline) ^ set(current)):
+        print('missing in {}: {}'.format('current' if key in baseline else 'baseline', key))
+    print('{} regression(s) beyond {:.0%}'.format(regressions, args.threshold))
+    return 1 if regressions else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='benchmarks', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command')
+    sub.required = True
+    r = sub.add_parser('run', help='run benchmarks')
+    r.add_argument('--output', '-o', help='write results as JSON to this file')
+    r.add_argument('--repeat', '-r', type=int, default=5, help='parses per benchmark')
+    r.add_argument('--seed', type=int, default=0, help='seed for input generators')
+    r.add_argument('--quick', action='store_true', help='use small inputs')
+    r.add_argument('--filter', '-k', help='only run benchmarks containing this string')
+    r.set_defaults(func=run)
+    c = sub.add_parser('compare', help='compare results against a baseline')
+    c.add_argument('baseline')
+    c.add_argument('current')
+    c.add_argument('--threshold', '-t', type=float, default=.1,
+                   help='relative change counted as regression (default 0.1)')
+    c.add_argument('--verbose', '-v', action='store_true', help='print all metrics')
+    c.set_defaults(func=compare)
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
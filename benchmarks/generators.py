@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Seeded generators for synthetic benchmark workloads. Every generator takes a
+random.Random instance (or seed) so that workloads are reproducible across runs.
+
+The output is tailored to the example grammars in pcombinators/tests: JSON is
+compact (the JSON example doesn't accept whitespace outside of strings) and
+strings never contain quotes.
+
+@author: lbo
+"""
+
+import json
+import random
+import string
+
+def _rng(seed):
+    if isinstance(seed, random.Random):
+        return seed
+    return random.Random(seed)
+
+def _word(rng, minlen=3, maxlen=10):
+    return ''.join(rng.choice(string.ascii_letters) for i in range(rng.randint(minlen, maxlen)))
+
+def _number(rng):
+    if rng.random() < .5:
+        return rng.randint(-10000, 10000)
+    return round(rng.uniform(-1000, 1000), 3)
+
+def _scalar(rng):
+    return _word(rng) if rng.random() < .3 else _number(rng)
+
+def _dumps(obj):
+    return json.dumps(obj, separators=(',', ':'))
+
+# JSON
+
+def json_flat(n, seed=0):
+    """A single object with n scalar members."""
+    rng = _rng(seed)
+    return _dumps({'{}{}'.format(_word(rng), i): _scalar(rng) for i in range(n)})
+
+def json_nested(depth, width=3, seed=0):
+    """Objects and lists nested `depth` levels deep, each level having `width` members."""
+    rng = _rng(seed)
+    def build(level):
+        if level == 0:
+            return _scalar(rng)
+        if level % 2:
+            return [build(level-1) for i in range(width)]
+        return {'{}{}'.format(_word(rng), i): build(level-1) for i in range(width)}
+    return _dumps(build(depth))
+
+def json_wide(n, members=20, seed=0):
+    """A list of n records with `members` fields each."""
+    rng = _rng(seed)
+    keys = ['{}{}'.format(_word(rng), i) for i in range(members)]
+    return _dumps([{k: _scalar(rng) for k in keys} for i in range(n)])
+
+# CSV
+
+def _csv_value(rng):
+    v = _scalar(rng)
+    if isinstance(v, str):
+        return '"{}"'.format(v)
+    return str(v)
+
+def csv_narrow(rows, cols=3, seed=0):
+    """rows lines of cols mostly numeric values."""
+    rng = _rng(seed)
+    return ''.join(', '.join(_csv_value(rng) for c in range(cols)) + '\n' for r in range(rows))
+
+def csv_wide(rows, cols=50, seed=0):
+    """Like csv_narrow(), but with many columns."""
+    return csv_narrow(rows, cols, seed)
+
+def csv_quoted(rows, cols=5, seed=0):
+    """rows lines of quoted strings containing separators."""
+    rng = _rng(seed)
+    def value():
+        return '"{}"'.format(', '.join(_word(rng) for i in range(rng.randint(1, 4))))
+    return ''.join(','.join(value() for c in range(cols)) + '\n' for r in range(rows))
+
+# Arithmetic expressions
+
+def arith(n, seed=0):
+    """An expression with n binary operators, using variables, numbers and parentheses."""
+    rng = _rng(seed)
+    def build(n):
+        if n == 0:
+            if rng.random() < .5:
+                return rng.choice(string.ascii_lowercase) + str(rng.randint(0, 9))
+            return str(abs(_number(rng)))
+        left = rng.randint(0, n-1)
+        expr = '{}{}{}'.format(build(left), rng.choice('+-*/^'), build(n-1-left))
+        if rng.random() < .2:
+            return '(' + expr + ')'
+        return expr
+    return build(n)
@@ -6,6 +6,8 @@ Created on Sun May 19 21:17:49 2019
 @author: lbo
 """
 
+__version__ = '0.1.0'
+
 from pcombinators.combinators import *
 from pcombinators.primitives import *
 from pcombinators.state import ps, ParseFileState
\ No newline at end of file
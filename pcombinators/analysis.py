@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Static analysis of parser graphs. Nothing here runs a parser; Lazy parsers are
+resolved (i.e. their function is called to construct the parser), though.
+
+Example:
+    for finding in analyze(parser):
+        print(finding)
+
+reports grammar shapes that are known to be slow or broken:
+
+*  nullable-loop: Repeat(p, -1) where p can succeed without consuming input. Such
+   a loop never terminates once p matches the empty string.
+*  left-recursion: a parser that can reach itself without consuming input. This
+   only surfaces as RecursionError when parsing.
+*  common-prefix: alternatives whose branches start with the same parsers, which
+   are then run once per branch.
+*  first-overlap: FirstAlternative branches that can start with the same character,
+   so that more than one branch may need to be tried.
+
+@author: lbo
+"""
+
+try:
+    import re._parser as _sre_parse
+    import re._constants as _sre
+except ImportError:
+    import sre_parse as _sre_parse
+    import sre_constants as _sre
+
+from pcombinators.combinators import (
+        Parser,
+        _Transform,
+        _Sequence,
+        OptimisticSequence,
+        _Repeat,
+        _Alternative,
+        FirstAlternative,
+        Peek,
+        Commit,
+        Lazy,
+        _concatenate)
+from pcombinators.primitives import (
+        String,
+        OneOf,
+        Regex,
+        EndOfInput,
+        Float,
+        Integer,
+        NumberList)
+from pcombinators.instrument import describe
+from pcombinators.intern import _Interner
+
+class FirstSet:
+    """A set of characters, which may be negated (everything except chars)."""
+
+    def __init__(self, chars='', negated=False):
+        self.chars = frozenset(chars)
+        self.negated = negated
+
+    def __contains__(self, c):
+        return (c in self.chars) != self.negated
+
+    def __or__(self, other):
+        if not self.negated and not other.negated:
+            return FirstSet(self.chars | other.chars)
+        if self.negated and other.negated:
+            return FirstSet(self.chars & other.chars, True)
+        pos, neg = (self, other) if other.negated else (other, self)
+        return FirstSet(neg.chars - pos.chars, True)
+
+    def __eq__(self, other):
+        return isinstance(other, FirstSet) and (self.chars, self.negated) == (other.chars, other.negated)
+
+    def __hash__(self):
+        return hash((self.chars, self.negated))
+
+    def intersection(self, other):
+        """Return characters in both sets. If the result is infinite, returns a negated FirstSet."""
+        if not self.negated and not other.negated:
+            return FirstSet(self.chars & other.chars)
+        if self.negated and other.negated:
+            return FirstSet(self.chars | other.chars, True)
+        pos, neg = (self, other) if other.negated else (other, self)
+        return FirstSet(pos.chars - neg.chars)
+
+    def empty(self):
+        return not self.negated and len(self.chars) == 0
+
+    def __repr__(self):
+        return 'FirstSet({!r}{})'.format(''.join(sorted(self.chars)), ', negated' if self.negated else '')
+
+EMPTY = FirstSet()
+ANY = FirstSet(negated=True)
+
+# Analysis of regular expressions, as far as it is simple. None as first set means "unknown".
+
+def _regex_items(items):
+    """Return (nullable, first) for a list of sre items."""
+    first = EMPTY
+    for op, av in items:
+        nullable, f = _regex_item(op, av)
+        if f is None:
+            return True, None
+        first = first | f
+        if not nullable:
+            return False, first
+    return True, first
+
+def _regex_item(op, av):
+    if op is _sre.LITERAL:
+        return False, FirstSet(chr(av))
+    if op is _sre.NOT_LITERAL:
+        return False, FirstSet(chr(av), True)
+    if op is _sre.ANY:
+        return False, ANY
+    if op is _sre.IN:
+        chars, negated = set(), False
+        for iop, iav in av:
+            if iop is _sre.NEGATE:
+                negated = True
+            elif iop is _sre.LITERAL:
+                chars.add(chr(iav))
+            elif iop is _sre.RANGE and iav[1] - iav[0] < 256:
+                chars.update(chr(c) for c in range(iav[0], iav[1]+1))
+            else:
+                # Categories like \d match non-ASCII characters, too.
+                return False, None
+        return False, FirstSet(chars, negated)
+    if op is _sre.MAX_REPEAT or op is _sre.MIN_REPEAT:
+        low, high, sub = av
+        nullable, first = _regex_items(sub)
+        return nullable or low == 0, first
+    if op is _sre.SUBPATTERN:
+        group, add_flags, del_flags, sub = av
+        if add_flags or del_flags:
+            return True, None
+        return _regex_items(sub)
+    if op is _sre.BRANCH:
+        nullable, first = False, EMPTY
+        for sub in av[1]:
+            n, f = _regex_items(sub)
+            if f is None:
+                return True, None
+            nullable, first = nullable or n, first | f
+        return nullable, first
+    # Anchors, assertions, backreferences...
+    return True, None
+
+def _regex_info(rx):
+    if rx.flags & (_sre.SRE_FLAG_IGNORECASE | _sre.SRE_FLAG_VERBOSE):
+        return rx.match('') is not None, None
+    try:
+        nullable, first = _regex_items(list(_sre_parse.parse(rx.pattern, rx.flags)))
+    except Exception:
+        return rx.match('') is not None, None
+    if first is None:
+        return rx.match('') is not None, None
+    return nullable, first
+
+_NUMBER_FIRST = FirstSet('+-0123456789')
+
+class _Node:
+    """Analysis state for one parser."""
+
+    def __init__(self, parser):
+        self.parser = parser
+        self.children = []
+        self.nullable = False
+        self.first = EMPTY
+
+class Finding:
+    """A problem found by analyze(). path lists the parsers from the root to the offending parser."""
+
+    def __init__(self, kind, parser, path, message):
+        self.kind = kind
+        self.parser = parser
+        self.path = path
+        self.message = message
+
+    def __str__(self):
+        return '{}: {} (at {})'.format(self.kind, self.message, ' > '.join(self.path))
+
+    def __repr__(self):
+        return 'Finding({})'.format(self)
+
+def _key(p):
+    # Grammars like the arithmetic example create new Lazy parsers for every level of
+    # nesting; treating all Lazy parsers of the same function as one keeps the graph finite.
+    if isinstance(p, Lazy):
+        return ('lazy', p._f)
+    return p
+
+class Grammar:
+    """The graph of parsers reachable from a root parser, with nullability and FIRST sets.
+
+    first(p) is None if the FIRST set of p is unknown; this is the case for custom parsers
+    and complicated regular expressions. nullable(p) means that p can succeed without consuming
+    input before the end of the input. Both are conservative: first(p) contains at least every
+    character that p can start with, and p is nullable if it might be.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        # key -> _Node; insertion ordered in breadth-first order.
+        self._nodes = {}
+        # key -> parent key, for finding paths.
+        self._parents = {}
+        self._analyzed = False
+        self._collect()
+
+    def parsers(self):
+        """Return all parsers in the graph, in breadth-first order."""
+        return [n.parser for n in self._nodes.values()]
+
+    def nullable(self, p):
+        self._fixpoint()
+        return self._nodes[_key(p)].nullable
+
+    def first(self, p):
+        self._fixpoint()
+        return self._nodes[_key(p)].first
+
+    def path(self, p):
+        """Return the names of parsers on the path from the root to p."""
+        path = []
+        k = _key(p)
+        while k is not None:
+            path.append(describe(self._nodes[k].parser))
+            k = self._parents.get(k)
+        path.reverse()
+        return path
+
+    def _collect(self):
+        queue = [self.root]
+        self._nodes[_key(self.root)] = _Node(self.root)
+        while queue:
+            p = queue.pop(0)
+            node = self._nodes[_key(p)]
+            for c in p.children():
+                k = _key(c)
+                if k not in self._nodes:
+                    self._nodes[k] = _Node(c)
+                    self._parents[k] = _key(p)
+                    queue.append(c)
+                node.children.append(self._nodes[k])
+
+    def _fixpoint(self):
+        if self._analyzed:
+            return
+        self._analyzed = True
+        changed = True
+        while changed:
+            changed = False
+            for node in self._nodes.values():
+                nullable, first = self._rule(node)
+                if nullable != node.nullable or first != node.first:
+                    node.nullable, node.first = nullable, first
+                    changed = True
+
+    def _info(self, p):
+        node = self._nodes[_key(p)]
+        return node.nullable, node.first
+
+    @staticmethod
+    def _union(a, b):
+        return None if a is None or b is None else a | b
+
+    def _sequence(self, parsers):
+        first = EMPTY
+        for p in parsers:
+            nullable, f = self._info(p)
+            first = self._union(first, f)
+            if not nullable:
+                return False, first
+        return True, first
+
+    def _rule(self, node):
+        p = node.parser
+        if isinstance(p, String):
+            return p._s == '', FirstSet(p._s[:1])
+        if isinstance(p, OneOf):
+            return False, FirstSet(p._set, p._inverse)
+        if isinstance(p, Regex):
+            return _regex_info(p._rx)
+        if isinstance(p, EndOfInput):
+            # Sequences and repeats fail at the end of input anyway, so EndOfInput never
+            # lets them succeed without consuming input.
+            return False, EMPTY
+        if isinstance(p, (Float, Integer, NumberList)):
+            return False, _NUMBER_FIRST
+        if isinstance(p, Lazy):
+            return self._info(p.parser())
+        if isinstance(p, _Transform):
+            nullable, first = self._info(p._inner)
+            if p._transform is _concatenate and isinstance(p._inner, _Repeat):
+                # ConcatenateResults fails if nothing was repeated.
+                nullable = self.nullable(p._inner._parser)
+            return nullable, first
+        if isinstance(p, _Sequence):
+            nullable, first = self._sequence(p._parsers)
+            if isinstance(p, OptimisticSequence) and len(p._parsers) > 0:
+                nullable = self.nullable(p._parsers[0])
+            return nullable, first
+        if isinstance(p, _Repeat):
+            nullable, first = self._info(p._parser)
+            return nullable or not p._strict or p._times == 0, first
+        if isinstance(p, _Alternative):
+            nullable, first = False, EMPTY
+            for c in p._parsers:
+                n, f = self._info(c)
+                nullable, first = nullable or n, self._union(first, f)
+            return nullable, first
+        if isinstance(p, Peek):
+            return True, self.first(p._parser)
+        if isinstance(p, Commit):
+            return self._info(p._parser)
+        # Unknown parser.
+        return False, None
+
+    def _left_children(self, p):
+        """Parsers that p may call before consuming any input."""
+        if isinstance(p, Lazy):
+            return [p.parser()]
+        if isinstance(p, _Transform):
+            return [p._inner]
+        if isinstance(p, _Sequence):
+            left = []
+            for c in p._parsers:
+                left.append(c)
+                if not self.nullable(c):
+                    break
+            return left
+        if isinstance(p, (_Repeat, Peek, Commit)):
+            return [p._parser]
+        if isinstance(p, _Alternative):
+            return list(p._parsers)
+        return p.children()
+
+    # Checks
+
+    def findings(self):
+        """Run all checks and return a list of Findings."""
+        self._fixpoint()
+        return (self._nullable_loops() + self._left_recursion() +
+                self._common_prefixes() + self._first_overlaps())
+
+    def _finding(self, kind, p, message):
+        return Finding(kind, p, self.path(p), message)
+
+    def _nullable_loops(self):
+        found = []
+        for p in self.parsers():
+            if isinstance(p, _Repeat) and p._times < 0 and self.nullable(p._parser):
+                found.append(self._finding('nullable-loop', p,
+                    '{} repeats {}, which can match empty input'.format(
+                        describe(p), describe(p._parser))))
+        return found
+
+    def _left_recursion(self):
+        found = []
+        reported = set()
+        done = set()
+        def visit(p, stack, on_stack):
+            k = _key(p)
+            if k in on_stack:
+                cycle = stack[stack.index(k):]
+                if frozenset(cycle) not in reported:
+                    reported.add(frozenset(cycle))
+                    names = [describe(self._nodes[c].parser) for c in cycle + [k]]
+                    found.append(self._finding('left-recursion', p,
+                        '{} can reach itself without consuming input: {}'.format(
+                            describe(p), ' > '.join(names))))
+                return
+            if k in done:
+                return
+            stack.append(k)
+            on_stack.add(k)
+            for c in self._left_children(p):
+                visit(c, stack, on_stack)
+            stack.pop()
+            on_stack.remove(k)
+            done.add(k)
+        for p in self.parsers():
+            visit(p, [], set())
+        return found
+
+    def _common_prefixes(self):
+        found = []
+        # Parsers are the same if intern() would merge them.
+        interner = _Interner(rewrite=False)
+        def same(a, b):
+            return interner.canonical(a) is interner.canonical(b)
+        for p in self.parsers():
+            if not isinstance(p, _Alternative):
+                continue
+            branches = [_leading(b) for b in p._parsers]
+            for i in range(len(branches)):
+                for j in range(i+1, len(branches)):
+                    n = 0
+                    while n < min(len(branches[i]), len(branches[j])) and same(branches[i][n], branches[j][n]):
+                        n += 1
+                    if n > 0:
+                        found.append(self._finding('common-prefix', p,
+                            'branches {} and {} of {} start with the same {} parser(s) ({}); '
+                            'consider factoring them out'.format(
+                                i, j, describe(p), n, ', '.join(describe(b) for b in branches[i][:n]))))
+        return found
+
+    def _first_overlaps(self):
+        found = []
+        for p in self.parsers():
+            if not isinstance(p, FirstAlternative):
+                continue
+            firsts = [self.first(b) for b in p._parsers]
+            for i in range(len(firsts)):
+                for j in range(i+1, len(firsts)):
+                    if firsts[i] is None or firsts[j] is None:
+                        continue
+                    common = firsts[i].intersection(firsts[j])
+                    if not common.empty():
+                        found.append(self._finding('first-overlap', p,
+                            'branches {} and {} of {} can both start with {}'.format(
+                                i, j, describe(p), _show(common))))
+        return found
+
+def _show(fs):
+    chars = ''.join(sorted(fs.chars))
+    if fs.negated:
+        return 'any character except {!r}'.format(chars) if chars else 'any character'
+    if len(chars) > 20:
+        chars = chars[:20] + '...'
+    return repr(chars)
+
+def _leading(p):
+    """The list of parsers p starts with, looking through transforms."""
+    while isinstance(p, _Transform):
+        p = p._inner
+    if isinstance(p, _Sequence):
+        return list(p._parsers)
+    return [p]
+
+def analyze(parser):
+    """Analyze the grammar reachable from parser, and return a list of Findings."""
+    return Grammar(parser).findings()
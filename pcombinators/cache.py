@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Result caching for parsers applied to many identical inputs, like the messages
+received by a long-running service.
+
+Example:
+    message = CachedParser(Value(), maxsize=10000, maxbytes=10**7)
+    result, st = message.parse(ParseState(text))
+    print(message.cache_info())
+
+@author: lbo
+"""
+
+import collections
+import copy
+import hashlib
+import threading
+import types
+
+from pcombinators.combinators import Parser
+from pcombinators.state import ParseState
+
+CacheInfo = collections.namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize', 'bytes'])
+
+def _rebuild(v, leaf, container):
+    """Rebuild the lists, tuples and dicts in v bottom-up: other values are replaced by
+    leaf(x), and containers by container(x, items), where items are the rebuilt elements
+    (values for dicts). Works without recursion, as results may be nested deeply."""
+    done = {}
+    stack = [(v, False)]
+    while stack:
+        x, expanded = stack.pop()
+        if id(x) in done:
+            continue
+        t = type(x)
+        if t is not list and t is not tuple and t is not dict:
+            done[id(x)] = leaf(x)
+            continue
+        items = list(x.values()) if t is dict else x
+        if expanded:
+            done[id(x)] = container(x, [done[id(i)] for i in items])
+        else:
+            stack.append((x, True))
+            stack.extend((i, False) for i in items)
+    return done[id(v)]
+
+def _copy_container(x, items):
+    if type(x) is dict:
+        return dict(zip(x.keys(), items))
+    return type(x)(items)
+
+def _copy(v):
+    """Return a deep copy of v."""
+    return _rebuild(v, copy.deepcopy, _copy_container)
+
+def _freeze_container(x, items):
+    if type(x) is dict:
+        return types.MappingProxyType(dict(zip(x.keys(), items)))
+    return tuple(items)
+
+def _freeze(v):
+    """Return an immutable version of v: lists become tuples, dicts read-only mappings
+    and sets frozensets."""
+    return _rebuild(v, lambda x: frozenset(x) if type(x) is set else x, _freeze_container)
+
+class CachedParser(Parser):
+    """Caches the results of parser by the remaining input, so that parsing an input
+    seen before costs one dictionary lookup. Failures are cached too.
+
+    Entries are evicted in least-recently-used order once there are more than maxsize,
+    or the inputs they were parsed from are longer than maxbytes characters in total
+    (None means no limit). Inputs longer than HASH_THRESHOLD characters are stored
+    as their SHA-256 hash.
+
+    Cached results are shared between all parses of the same input, so they must not be
+    modified. mode determines how this is ensured:
+        'copy': results are deep-copied when stored and when returned
+        'freeze': results are converted to immutable types (lists to tuples, dicts to
+            read-only mappings, sets to frozensets), also on the first parse
+        'share': results are returned as they are, and the caller promises not to
+            modify them
+
+    Only ParseState inputs are cached; other states (like ParseFileState, which can't look
+    ahead to the end of the input) are passed to parser directly. Use CachedParser at the
+    top of a grammar: a cache hit skips side effects on the state like Commit.
+    """
+
+    # Longer inputs are keyed by their hash instead of their text.
+    HASH_THRESHOLD = 1024
+
+    def __init__(self, parser, maxsize=1024, maxbytes=None, mode='copy'):
+        if mode not in ('copy', 'freeze', 'share'):
+            raise ValueError('unknown cache mode {!r}'.format(mode))
+        self._parser = parser
+        self._maxsize = maxsize
+        self._maxbytes = maxbytes
+        self._mode = mode
+        # key -> (result, consumed characters, size)
+        self._entries = collections.OrderedDict()
+        self._stats = {'hits': 0, 'misses': 0, 'bytes': 0}
+        self._lock = threading.Lock()
+
+    def parse(self, st):
+        if type(st) is not ParseState:
+            return self._parser.parse(st)
+        key, size, hit = self._lookup(st)
+        if hit is not None:
+            return hit
+        start = st.index()
+        result, st = self._parser.parse(st)
+        return self._miss(key, size, start, result, st)
+
+    def _steps(self, st):
+        if type(st) is not ParseState:
+            return (yield self._parser, st)
+        key, size, hit = self._lookup(st)
+        if hit is not None:
+            return hit
+        start = st.index()
+        result, st = yield self._parser, st
+        return self._miss(key, size, start, result, st)
+
+    def _lookup(self, st):
+        """Return the cache key for st, the length of its remaining input, and the
+        parse result if it was cached (otherwise None)."""
+        text = st.remaining()
+        key = text
+        if len(text) > self.HASH_THRESHOLD:
+            key = hashlib.sha256(text.encode('utf-8', 'surrogatepass')).digest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+            else:
+                self._stats['misses'] += 1
+        if entry is None:
+            return key, len(text), None
+        result, consumed, _ = entry
+        if result is None:
+            return key, len(text), (None, st)
+        st.advance(consumed)
+        return key, len(text), ((_copy(result) if self._mode == 'copy' else result), st)
+
+    def _miss(self, key, size, start, result, st):
+        """Store the result of parsing the input that wasn't found in the cache."""
+        if self._mode == 'freeze':
+            result = _freeze(result)
+        stored = _copy(result) if self._mode == 'copy' else result
+        self._store(key, stored, st.index() - start if result is not None else 0, size)
+        return result, st
+
+    def _store(self, key, result, consumed, size):
+        if self._maxbytes is not None and size > self._maxbytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._stats['bytes'] -= old[2]
+            self._entries[key] = (result, consumed, size)
+            self._stats['bytes'] += size
+            while (len(self._entries) > self._maxsize or
+                   (self._maxbytes is not None and self._stats['bytes'] > self._maxbytes)):
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._stats['bytes'] -= evicted
+
+    def cache_info(self):
+        """Return hits, misses, maxsize, currsize (number of entries) and bytes (total
+        length of cached inputs), like functools.lru_cache."""
+        with self._lock:
+            return CacheInfo(self._stats['hits'], self._stats['misses'], self._maxsize,
+                             len(self._entries), self._stats['bytes'])
+
+    def cache_clear(self):
+        """Remove all entries and reset the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self._stats = {'hits': 0, 'misses': 0, 'bytes': 0}
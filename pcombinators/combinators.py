@@ -7,10 +7,16 @@ The monad here is the result tuple (result, ParseState), which is returned
 by all Parser's parse() method.
 """
 
+from pcombinators.state import CommitError
+
 class Parser:
     """Super class for all parsers. Implements operator overloading for easier
     chaining of parsers."""
     type = None
+    _name = None
+    # Combinators implement _steps(st) as a generator for the iterative engine
+    # (pcombinators.engine), mirroring parse(). Parsers without it are called directly.
+    _steps = None
 
     def parse(self, st):
         """Call parse() on any class inheriting from this one. It will consume
@@ -50,6 +56,14 @@ class Parser:
         """
         return _Transform(self, fn)
 
+    def __invert__(self):
+        """Commit to the current path before parsing with this parser (see Commit).
+
+        Example:
+            Skip(String('{')) + ~Repeat(entry, -1) + Skip(String('}'))
+        """
+        return Commit(self)
+
     def then(self, next):
         """Consume part of the input, discarding it, and return the result
         parsed by the supplied next parser."""
@@ -58,6 +72,85 @@ class Parser:
     def then_skip(self, next):
         return Last(AtomicSequence(self, Skip(next)))
 
+    def iterate(self, st):
+        """Parse repeatedly, yielding every result as soon as it is parsed.
+
+        This is like Repeat(parser, -1), but results are not collected in a list. As no
+        backtracking points are kept between results, ParseFileState can discard input
+        after every result, so memory use doesn't grow with the number of results.
+        Stops at the end of input, or when the parser fails or doesn't consume input;
+        st is then positioned after the last match. Deferred actions (see defer()) in the
+        results are evaluated.
+
+        Example:
+            for record in line.iterate(ParseFileState('data.csv')):
+                process(record)
+        """
+        while not st.finished():
+            before = st.index()
+            r, st = self.parse(st)
+            if r is None:
+                return
+            st._maybe_collect()
+            if type(r) is _Thunk or type(r) is _Pending:
+                r = force(r)
+            if r is not SKIP_MARKER and r is not PEEK_SUCCESS_MARKER:
+                yield r
+            if st.index() == before:
+                return
+
+    def defer(self, fn):
+        """Like `self >> fn`, but fn is only called once the result is final: the result
+        is a deferred action, which is evaluated by force(), or by an enclosing Commit.
+        Results discarded by backtracking never call fn, which helps with expensive
+        functions like building domain objects.
+
+        Unlike with >>, fn can't reject a result by returning None, as it is called after
+        parsing, and sequences don't merge list results of fn into their results.
+        Exceptions raised by fn propagate from force().
+
+        Deferral ends at the next enclosing >>: functions applied by >> (and by the helpers
+        built on it, like Flatten() or ConcatenateResults()) receive their input with all
+        deferred actions evaluated, so defer() can be used in parts of a grammar only.
+        Skip() and Last() don't look at the results they pass on, and don't evaluate them.
+
+        Example:
+            record = (Repeat(field, -1) + Skip(String('\\n'))).defer(Record)
+            force(Repeat(record, -1).parse(st)[0])
+        """
+        return _Deferred(self, fn)
+
+    def named(self, name):
+        """Attach a label to this parser, which is shown by diagnostic tools like the
+        profiler instead of the class name. Returns the parser itself.
+
+        Example:
+            entry = (Value() + Skip(String(','))).named('entry')
+        """
+        self._name = name
+        return self
+
+    def children(self):
+        """Return the parsers this parser is composed of.
+
+        The default implementation finds all parsers (and lists or tuples of parsers)
+        stored as attributes of the parser object or its class. Parsers constructing
+        sub-parsers inside parse() are opaque to this.
+        """
+        found = []
+        seen = set()
+        def add(v):
+            if isinstance(v, Parser):
+                found.append(v)
+            elif isinstance(v, (list, tuple)):
+                found.extend(p for p in v if isinstance(p, Parser))
+        for attrs in [vars(self)] + [vars(c) for c in type(self).__mro__]:
+            for name, v in attrs.items():
+                if name not in seen:
+                    seen.add(name)
+                    add(v)
+        return found
+
 # Combinators
 
 class _Transform(Parser):
@@ -73,11 +166,65 @@ class _Transform(Parser):
         if r is None:
             return None, st
         try:
+            if (type(r) is _Thunk or type(r) is _Pending) and self._transform not in _STRUCTURAL:
+                r = force(r)
+            r2 = self._transform(r)
+            return r2, st2
+        except Exception as e:
+            raise Exception('{} (at {} (col {}))'.format(e, st, st.index()))
+
+    def _steps(self, st):
+        r, st2 = yield self._inner, st
+        if r is None:
+            return None, st
+        try:
+            if (type(r) is _Thunk or type(r) is _Pending) and self._transform not in _STRUCTURAL:
+                r = force(r)
             r2 = self._transform(r)
             return r2, st2
         except Exception as e:
             raise Exception('{} (at {} (col {}))'.format(e, st, st.index()))
 
+class _Deferred(_Transform):
+    """A _Transform applying its function only when forced; see Parser.defer()."""
+
+    def parse(self, st):
+        r, st2 = self._inner.parse(st)
+        if r is None:
+            return None, st
+        return _Thunk(self._transform, r), st2
+
+    def _steps(self, st):
+        r, st2 = yield self._inner, st
+        if r is None:
+            return None, st
+        return _Thunk(self._transform, r), st2
+
+class _Thunk:
+    """A deferred action: fn applied to the (forced) result r."""
+    __slots__ = ('fn', 'r')
+
+    def __init__(self, fn, r):
+        self.fn = fn
+        self.r = r
+
+    def __repr__(self):
+        return '_Thunk({}, {!r})'.format(getattr(self.fn, '__name__', self.fn), self.r)
+
+class _Pending(list):
+    """A list result of a sequence or repeat containing deferred actions, directly or
+    in _Pending elements. Other results contain none, so force() only has to look at these."""
+    __slots__ = ()
+
+def force(result):
+    """Evaluate the deferred actions (see Parser.defer()) in a parse result. Returns the
+    evaluated result."""
+    if type(result) is _Thunk:
+        return result.fn(force(result.r))
+    if type(result) is _Pending:
+        return [force(r) if type(r) is _Thunk or type(r) is _Pending else r for r in result]
+    return result
+
 class _Sequence(Parser):
     _parsers = []
     _atomic = None
@@ -100,6 +247,7 @@ class _Sequence(Parser):
 
     def parse(self, st):
         results = []
+        pending = False
         if st.finished():
             return None, st
         hold = st.hold() if self._atomic else None
@@ -112,12 +260,38 @@ class _Sequence(Parser):
                 break
             if result is not SKIP_MARKER and result is not PEEK_SUCCESS_MARKER:
                 results.append(result)
+                if type(result) is _Thunk or type(result) is _Pending:
+                    pending = True
+            st = st2
+        if self._atomic:
+            st.release(hold)
+        if len(results) == 0:
+            return None, st2
+        return (_Pending(results) if pending else results), st2
+
+    def _steps(self, st):
+        results = []
+        pending = False
+        if st.finished():
+            return None, st
+        hold = st.hold() if self._atomic else None
+        for p in self._parsers:
+            result, st2 = yield p, st
+            if result is None:
+                if self._atomic:
+                    st.reset(hold)
+                    return None, st
+                break
+            if result is not SKIP_MARKER and result is not PEEK_SUCCESS_MARKER:
+                results.append(result)
+                if type(result) is _Thunk or type(result) is _Pending:
+                    pending = True
             st = st2
         if self._atomic:
             st.release(hold)
         if len(results) == 0:
             return None, st2
-        return results, st2
+        return (_Pending(results) if pending else results), st2
 
 
 class AtomicSequence(_Sequence):
@@ -153,6 +327,7 @@ class _Repeat(Parser):
         if st.finished():
             return None, st
         results = []
+        pending = False
         # We only need to remember where we started in case we need to actually
         # come back here, i.e. if this is a strict repeat.
         hold = st.hold() if self._strict else None
@@ -166,15 +341,45 @@ class _Repeat(Parser):
                 assert hold is None
                 if len(results) == 0:
                     return SKIP_MARKER, st2
-                return results, st2
+                return (_Pending(results) if pending else results), st2
+            if r is not SKIP_MARKER and r is not PEEK_SUCCESS_MARKER:
+                results.append(r)
+                if type(r) is _Thunk or type(r) is _Pending:
+                    pending = True
+            st = st2
+            i += 1
+        st.release(hold)
+        if len(results) == 0:
+            return None, st
+        return (_Pending(results) if pending else results), st
+
+    def _steps(self, st):
+        if st.finished():
+            return None, st
+        results = []
+        pending = False
+        hold = st.hold() if self._strict else None
+        i = 0
+        while i < self._times or self._times < 0:
+            r, st2 = yield self._parser, st
+            if r == None:
+                if self._strict:
+                    st.reset(hold)
+                    return None, st
+                assert hold is None
+                if len(results) == 0:
+                    return SKIP_MARKER, st2
+                return (_Pending(results) if pending else results), st2
             if r is not SKIP_MARKER and r is not PEEK_SUCCESS_MARKER:
                 results.append(r)
+                if type(r) is _Thunk or type(r) is _Pending:
+                    pending = True
             st = st2
             i += 1
         st.release(hold)
         if len(results) == 0:
             return None, st
-        return results, st
+        return (_Pending(results) if pending else results), st
 
 class StrictRepeat(_Repeat):
     """Expect exactly `repeat` matches of a parser. Result is list of results of the parsers."""
@@ -198,14 +403,125 @@ class _Alternative(Parser):
 
 class FirstAlternative(_Alternative):
     """Attempt parsers until one matches. Result is result of that parser."""
+    # Installed by pcombinators.optimize: for every parser a FirstSet of characters it
+    # can start with, or None if it needs to be tried regardless of the next character.
+    _guards = None
 
     def parse(self, st):
-        for p in self._parsers:
+        for p in self._parsers if self._guards is None else self._candidates(st):
             r, st2 = p.parse(st)
             if r is not None:
                 return r, st2
         return None, st
 
+    def _candidates(self, st):
+        """Return the parsers that can match given the next character."""
+        c = st.peek()
+        try:
+            return self._dispatch[c]
+        except KeyError:
+            if c is None:
+                candidates = self._parsers
+            else:
+                candidates = tuple(p for (p, g) in zip(self._parsers, self._guards) if g is None or c in g)
+            self._dispatch[c] = candidates
+            return candidates
+
+    def _steps(self, st):
+        for p in self._parsers if self._guards is None else self._candidates(st):
+            r, st2 = yield p, st
+            if r is not None:
+                return r, st2
+        return None, st
+
+class AdaptiveAlternative(FirstAlternative):
+    """A FirstAlternative that counts how often each parser matches, and periodically
+    moves frequently matching parsers to the front.
+
+    Only parsers that can't match the same input change places, so that the result
+    doesn't depend on the order: parsers whose FIRST sets (see pcombinators.analysis)
+    are disjoint and which don't match the empty string. If order_independent is true,
+    the caller guarantees this for all parsers, and any order is allowed.
+
+    Example:
+        value = AdaptiveAlternative(integer, Float(), Last(string))
+    """
+    # Reorder after this many calls. Hit counts are halved after reordering, so that
+    # the order follows changes in the input.
+    REORDER_INTERVAL = 1024
+
+    def __init__(self, *parsers, order_independent=False):
+        super().__init__(*parsers)
+        self._order_independent = order_independent
+        self._hits = {}
+        self._calls = 0
+        # (id(a), id(b)) -> whether a and b can change places.
+        self._independent = None
+
+    def parse(self, st):
+        self._calls += 1
+        if self._calls >= self.REORDER_INTERVAL:
+            self._reorder()
+        for p in self._parsers if self._guards is None else self._candidates(st):
+            r, st2 = p.parse(st)
+            if r is not None:
+                self._hits[p] = self._hits.get(p, 0) + 1
+                return r, st2
+        return None, st
+
+    def _steps(self, st):
+        self._calls += 1
+        if self._calls >= self.REORDER_INTERVAL:
+            self._reorder()
+        for p in self._parsers if self._guards is None else self._candidates(st):
+            r, st2 = yield p, st
+            if r is not None:
+                self._hits[p] = self._hits.get(p, 0) + 1
+                return r, st2
+        return None, st
+
+    def _can_swap(self, a, b):
+        if self._order_independent:
+            return True
+        if self._independent is None:
+            from pcombinators.analysis import Grammar
+            grammar = Grammar(self)
+            self._independent = {}
+            for x in self._parsers:
+                for y in self._parsers:
+                    fx, fy = grammar.first(x), grammar.first(y)
+                    self._independent[(id(x), id(y))] = (
+                        x is not y and fx is not None and fy is not None and
+                        not grammar.nullable(x) and not grammar.nullable(y) and
+                        fx.intersection(fy).empty())
+        return self._independent.get((id(a), id(b)), False)
+
+    def _reorder(self):
+        """Sort parsers by hit count, only swapping neighbors that can change places."""
+        self._calls = 0
+        order = list(range(len(self._parsers)))
+        hits = [self._hits.get(p, 0) for p in self._parsers]
+        changed = True
+        while changed:
+            changed = False
+            for i in range(len(order) - 1):
+                a, b = order[i], order[i+1]
+                if hits[b] > hits[a] and self._can_swap(self._parsers[a], self._parsers[b]):
+                    order[i], order[i+1] = b, a
+                    changed = True
+        if order != sorted(order):
+            self._parsers = tuple(self._parsers[i] for i in order)
+            if self._guards is not None:
+                self._guards = [self._guards[i] for i in order]
+                self._dispatch = {}
+        self._hits = {p: n // 2 for (p, n) in self._hits.items()}
+
+# Attributes that don't describe the structure of a parser, as they change after it was
+# built: instrumentation wrappers (see pcombinators.instrument), FirstAlternative dispatch
+# tables and AdaptiveAlternative statistics. Ignored by pcombinators.intern and by the
+# grammar key of pcombinators.optimize.
+_RUNTIME_ATTRIBUTES = ('parse', '_guards', '_dispatch', '_hits', '_calls', '_independent')
+
 class LongestAlternative(_Alternative):
     """Attempt all parsers and return the longest match. Result is result of best parser.
 
@@ -222,7 +538,22 @@ class LongestAlternative(_Alternative):
             matches.append((st2.index() - initial, r))
             st = st2
             st.reset(hold)
+        return self._best(matches, hold, st)
 
+    def _steps(self, st):
+        matches = []
+        hold = st.hold()
+        initial = st.index()
+        for p in self._parsers:
+            r, st2 = yield p, st
+            if r is None:
+                continue
+            matches.append((st2.index() - initial, r))
+            st = st2
+            st.reset(hold)
+        return self._best(matches, hold, st)
+
+    def _best(self, matches, hold, st):
         if len(matches) == 0:
             return None, st
         # Stable sort!
@@ -240,19 +571,32 @@ class LongestAlternative(_Alternative):
 
 # Some combinators can be implemented directly.
 
+def _last(l):
+    return l[-1] if isinstance(l, list) else l
+
 def Last(p):
     """Return the last result from the list of results of p. Result is scalar."""
-    return p >> (lambda l: l[-1] if isinstance(l, list) else l)
+    return p >> _last
 
 SKIP_MARKER = []
 
+def _skip(r):
+    return SKIP_MARKER
+
 def Skip(p):
     """Omit the result of parser p, and replace it with []. Result is []."""
-    return p >> (lambda r: SKIP_MARKER)
+    return p >> _skip
+
+# Transform functions passing on results without looking at them, which don't need deferred
+# actions (see Parser.defer()) to be evaluated.
+_STRUCTURAL = (_last, _skip)
+
+def _concatenate(l):
+    return ''.join(l) if l and len(l) > 0 else None
 
 def ConcatenateResults(p):
     """Concatenate string results into a single string. Result is string."""
-    return p >> (lambda l: ''.join(l) if l and len(l) > 0 else None)
+    return p >> _concatenate
 
 def Flatten(p):
     """Flatten the list result of a parser p (merge inner lists). Result is list."""
@@ -289,6 +633,51 @@ class Peek(Parser):
         st.reset(hold)
         return PEEK_SUCCESS_MARKER, st2
 
+    def _steps(self, st):
+        hold = st.hold()
+        r, st2 = yield self._parser, st
+        if r is None:
+            st.release(hold)
+            return None, st
+        st.reset(hold)
+        return PEEK_SUCCESS_MARKER, st2
+
+class Commit(Parser):
+    """A cut: once reached, the parse is committed to the current path.
+
+    All enclosing backtracking points are dropped, so that ParseFileState can discard
+    input consumed so far. If p fails, or any enclosing parser tries to backtrack to before
+    this point later, CommitError is raised instead of trying other alternatives.
+    As the result of p is final, deferred actions in it (see Parser.defer()) are evaluated.
+    Use it once a grammar has seen enough input to know that no other alternative could match.
+    `~p` is a shorthand for Commit(p).
+
+    Don't commit inside of Peek() or LongestAlternative(), which always backtrack.
+
+    Example:
+        Skip(String('[')) + ~(Repeat(entry, -1) + Skip(String(']')))
+    """
+    def __init__(self, p):
+        self._parser = p
+
+    def parse(self, st):
+        st.commit()
+        r, st2 = self._parser.parse(st)
+        return self._check(r, st), st2
+
+    def _steps(self, st):
+        st.commit()
+        r, st2 = yield self._parser, st
+        return self._check(r, st), st2
+
+    def _check(self, r, st):
+        if r is None:
+            raise CommitError('{} failed after commit (at {} (col {}))'.format(
+                self._parser._name or type(self._parser).__name__, st, st.index()))
+        if type(r) is _Thunk or type(r) is _Pending:
+            return force(r)
+        return r
+
 class Lazy(Parser):
     """A transparent wrapper for avoiding mutual recursion and definition order trouble, which
     can occur if your syntax is infinitely recursive.
@@ -306,4 +695,10 @@ class Lazy(Parser):
         return self._parser
 
     def parse(self, st):
-        return self.parser().parse(st)
\ No newline at end of file
+        return self.parser().parse(st)
+
+    def _steps(self, st):
+        return (yield self.parser(), st)
+
+    def children(self):
+        return [self.parser()]
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+An iterative execution engine for parsers.
+
+Parser.parse() calls the parse() method of sub-parsers recursively, so that deeply
+nested input (e.g. a JSON list nested a few hundred levels deep) runs into Python's
+recursion limit. parse() in this module runs the same parser graph with an explicit
+stack instead: combinators implement a generator _steps(st), which yields
+(sub-parser, state) whenever they would call a sub-parser and receives its result back.
+The nesting depth is then only limited by memory.
+
+Parsers without _steps (like String, Regex, Float or custom parsers) are called
+directly; custom parsers delegating to others should derive from Lazy to avoid
+recursion. Instrumentation (see pcombinators.profile) is bypassed by this engine.
+
+Example:
+    >>> engine.parse(Value(), ParseState('[' * 10000 + ']' * 10000))
+
+@author: lbo
+"""
+
+def parse(parser, st):
+    """Parse st using parser. Equivalent to parser.parse(st), but without recursion."""
+    if parser._steps is None:
+        return parser.parse(st)
+    stack = [parser._steps(st)]
+    result = None
+    while stack:
+        try:
+            p, st = stack[-1].send(result)
+        except StopIteration as e:
+            stack.pop()
+            result = e.value
+            continue
+        if p._steps is None:
+            result = p.parse(st)
+        else:
+            stack.append(p._steps(st))
+            result = None
+    return result
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Incremental reparsing.
+
+parse_incremental() parses a string like parser.parse(ParseState(text)), but memoizes
+the result of every combinator at every position, together with the extent of input it
+looked at. reparse() applies edits to the text and parses it again, reusing all memoized
+results whose input wasn't touched by the edits (shifting them as needed). Only the
+combinators covering an edited region, and the ones enclosing them, run again.
+
+Example:
+    tree = parse_incremental(Value(), text)
+    tree = reparse(tree, [(120, 121, '7')])  # replace text[120:121] with '7'
+    tree.value
+
+Memoized results are shared between trees; don't modify them in place. Parsers that
+scan the whole remaining input (like Regex) are treated as depending on all of it, and
+can only be reused if the edit is before them.
+
+@author: lbo
+"""
+
+import bisect
+
+from pcombinators.instrument import Instrumentation
+from pcombinators.state import ParseState
+
+class _TrackingState(ParseState):
+    """A ParseState recording how far parsers have looked at the input. _examined is the
+    index after the last examined character (or end of input)."""
+
+    def __init__(self, s):
+        super().__init__(s)
+        self._examined = 0
+
+    def _examine(self, end):
+        if end > self._examined:
+            self._examined = end
+
+    def next(self):
+        self._examine(self._index + 1)
+        return super().next()
+
+    def peek(self):
+        self._examine(self._index + 1)
+        return super().peek()
+
+    def finished(self):
+        self._examine(self._index + 1)
+        return super().finished()
+
+    def remaining(self, nmin=-1):
+        self._examine(self._end + 1 if nmin == -1 else self._index + nmin)
+        return super().remaining(nmin)
+
+    def match(self, rx, lookahead=None):
+        m = super().match(rx, lookahead)
+        if lookahead is None:
+            self._examine(self._end + 1)
+        else:
+            self._examine((self._index if m is None else m.end()) + lookahead)
+        return m
+
+class _Edit:
+    def __init__(self, start, end, new_start, new_end):
+        self.start, self.end = start, end
+        self.new_start, self.new_end = new_start, new_end
+        # An insertion affects everything looking at its position.
+        self.affects_until = max(end, start + 1)
+
+class _Generation:
+    """Memo table of one parse. Entries map (parser, start) to (result, end, examined).
+    Lookups missing in this table are translated through the edits to the previous
+    generation's positions."""
+
+    # Only this many generations are kept; older results are parsed again if needed.
+    MAX_DEPTH = 8
+
+    def __init__(self, previous=None, edits=()):
+        self.table = {}
+        self.previous = previous
+        self.edits = list(edits)
+        self._affects_until = [e.affects_until for e in self.edits]
+        self._new_starts = [e.new_start for e in self.edits]
+        self.hits = 0
+        self.misses = 0
+        depth, g = 0, self
+        while g.previous is not None:
+            depth += 1
+            if depth >= self.MAX_DEPTH:
+                g.previous = None
+                break
+            g = g.previous
+
+    def lookup(self, parser, start):
+        entry = self.table.get((parser, start))
+        if entry is not None or self.previous is None:
+            return entry
+        # Translate start to the previous generation's coordinates.
+        k = bisect.bisect_right(self._new_starts, start) - 1
+        if k >= 0:
+            edit = self.edits[k]
+            if start < edit.new_end:
+                # Inside of inserted text.
+                return None
+            old_start = start - edit.new_end + edit.end
+        else:
+            old_start = start
+        entry = self.previous.lookup(parser, old_start)
+        if entry is None:
+            return None
+        r, end, examined = entry
+        # Check that no edit touches [old_start, examined).
+        k = bisect.bisect_right(self._affects_until, old_start)
+        if k < len(self.edits) and self.edits[k].start < examined:
+            return None
+        shift = start - old_start
+        entry = (r, end + shift, examined + shift)
+        self.table[(parser, start)] = entry
+        return entry
+
+class _Memoizer(Instrumentation):
+
+    def __init__(self, generation):
+        super().__init__()
+        self.generation = generation
+
+    def wrap(self, parser, parse):
+        if not parser.children():
+            # Memoizing primitive parsers costs more than it saves.
+            return parse
+        generation = self.generation
+        table = generation.table
+        def memoized(st):
+            start = st._index
+            entry = generation.lookup(parser, start)
+            if entry is not None:
+                generation.hits += 1
+                r, end, examined = entry
+                st._index = end
+                st._examine(examined)
+                return r, st
+            generation.misses += 1
+            outer = st._examined
+            st._examined = start
+            r, st2 = parse(st)
+            examined = max(st._examined, st2._index)
+            table[(parser, start)] = (r, st2._index, examined)
+            st._examined = max(outer, examined)
+            return r, st2
+        return memoized
+
+class ParseTree:
+    """The result of parse_incremental() or reparse().
+
+    value and state are the result of parsing text with parser. hits and misses count how
+    many combinator invocations were answered from memoized results.
+    """
+
+    def __init__(self, parser, text, generation):
+        self.parser = parser
+        self.text = text
+        self._generation = generation
+        self.value, self.state = _Memoizer(generation).run(parser, _TrackingState(text))
+        self.hits = generation.hits
+        self.misses = generation.misses
+
+    def __repr__(self):
+        return 'ParseTree({!r}, hits={}, misses={})'.format(self.value, self.hits, self.misses)
+
+def parse_incremental(parser, text):
+    """Parse text with parser, remembering sub-results for reparse(). Returns a ParseTree."""
+    return ParseTree(parser, text, _Generation())
+
+def reparse(tree, edits):
+    """Apply edits to the text of tree and parse it again, reusing unaffected sub-results.
+
+    edits is a list of (start, end, replacement) tuples, each replacing tree.text[start:end]
+    with the string replacement. Positions refer to the old text, and edits must not overlap.
+    Returns a new ParseTree.
+    """
+    edits = sorted(edits, key=lambda e: (e[0], e[1]))
+    pieces = []
+    translated = []
+    last = 0
+    delta = 0
+    for (start, end, replacement) in edits:
+        if start < last or end < start or end > len(tree.text):
+            raise ValueError('bad or overlapping edit ({}, {})'.format(start, end))
+        pieces.append(tree.text[last:start])
+        pieces.append(replacement)
+        new_start = start + delta
+        delta += len(replacement) - (end - start)
+        translated.append(_Edit(start, end, new_start, end + delta))
+        last = end
+    pieces.append(tree.text[last:])
+    return ParseTree(tree.parser, ''.join(pieces), _Generation(tree._generation, translated))
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Instrumentation of parser graphs, e.g. for profiling.
+
+Instrumentation works by installing a wrapper as `parse` attribute on parser
+instances, which shadows the class' parse() method. After uninstall(), the
+attribute is removed again; parsers that are not instrumented therefore run
+exactly the same code as if instrumentation didn't exist.
+
+@author: lbo
+"""
+
+def describe(p):
+    """Return a short name for parser p: its label (see Parser.named()) or class name."""
+    return p._name or type(p).__name__
+
+class Instrumentation:
+    """Base class for tools wrapping the parse() method of every parser in a graph.
+
+    Parsers are instrumented on demand: the children of a parser are only wrapped
+    when it is called for the first time. This way, parsers that are created while
+    parsing (e.g. by Lazy) are covered, and recursive grammars don't need to be
+    walked up front.
+
+    Only one instrumentation can be installed on a parser at a time; parsers already
+    carrying a wrapper are left alone.
+
+    Subclasses implement wrap().
+    """
+
+    def __init__(self):
+        self._instrumented = []
+
+    def wrap(self, parser, parse):
+        """Return a function replacing the bound method `parse` of `parser`."""
+        raise NotImplementedError()
+
+    def install(self, parser):
+        """Instrument parser and (on demand) all parsers reachable from it. Returns self."""
+        self._instrument(parser)
+        return self
+
+    def uninstall(self):
+        """Remove all wrappers installed by this instrumentation."""
+        for p in self._instrumented:
+            if 'parse' in vars(p):
+                del p.parse
+        self._instrumented = []
+
+    def run(self, parser, st):
+        """Instrument parser, parse st, and remove the instrumentation again.
+        Returns the parse result."""
+        self.install(parser)
+        try:
+            return parser.parse(st)
+        finally:
+            self.uninstall()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.uninstall()
+
+    def _instrument(self, parser):
+        if 'parse' in vars(parser):
+            return
+        wrapped = self.wrap(parser, parser.parse)
+        def first_call(st):
+            parser.parse = wrapped
+            for c in parser.children():
+                self._instrument(c)
+            return wrapped(st)
+        parser.parse = first_call
+        self._instrumented.append(parser)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Interning (hash-consing) of parser graphs.
+
+Grammars built from functions create many structurally equal parsers: every call of
+Whitespace() builds a new CharSet, and a grammar like the arithmetic example builds a
+new Term graph inside every Parens(). intern() replaces each parser in a graph by one
+shared instance per structure, so that the graph uses less memory and per-parser
+data (FIRST sets, dispatch tables, memo tables, profiles) is shared between copies.
+
+Two parsers are structurally equal if they have the same class and equal attributes,
+where parser attributes are compared by (interned) identity and functions by their
+code, defaults and closure. Lazy parsers are compared by their function before being
+resolved, which keeps recursive grammars finite.
+
+Example:
+    parser = intern(Term())
+
+@author: lbo
+"""
+
+import types
+
+from pcombinators.combinators import Parser, Lazy, _RUNTIME_ATTRIBUTES
+
+# Stands for the parser being keyed, in closures referring to it (like Lazy subclasses
+# passing `lambda: ... self ...`).
+_SELF = object()
+
+class _Interner:
+    """Maps parsers to a canonical parser per structure. With rewrite, the children of
+    parsers are replaced by their canonical versions; otherwise, the graph isn't modified
+    (canonical(a) is canonical(b) then only tells whether a and b are structurally equal)."""
+
+    def __init__(self, rewrite=True):
+        self._rewrite_children = rewrite
+        # structural key -> canonical parser
+        self._table = {}
+        # id(parser) -> canonical parser; holds on to parsers so that ids stay unique.
+        self._canonical = {}
+        self._seen = []
+        self._in_progress = set()
+
+    def canonical(self, p):
+        c = self._canonical.get(id(p))
+        if c is not None:
+            return c
+        if id(p) in self._in_progress:
+            # A cycle not going through a Lazy parser; p stays as it is.
+            return p
+        self._in_progress.add(id(p))
+        self._seen.append(p)
+        try:
+            if isinstance(p, Lazy):
+                c = self._lazy(p)
+            else:
+                if self._rewrite_children:
+                    self._rewrite(p)
+                c = self._table.setdefault(self._key(p), p)
+        finally:
+            self._in_progress.discard(id(p))
+        self._canonical[id(p)] = c
+        return c
+
+    def _lazy(self, p):
+        key = self._key(p, skip='_parser')
+        c = self._table.get(key)
+        if c is not None:
+            return c
+        self._table[key] = p
+        # Register p before resolving it, so that recursive references find it.
+        self._canonical[id(p)] = p
+        if self._rewrite_children:
+            p._parser = self.canonical(p.parser())
+        return p
+
+    def _rewrite(self, p):
+        """Replace the children stored in p's attributes by their canonical versions."""
+        for name, v in list(vars(p).items()):
+            if name in _RUNTIME_ATTRIBUTES:
+                continue
+            if isinstance(v, Parser):
+                setattr(p, name, self.canonical(v))
+            elif isinstance(v, (list, tuple)) and any(isinstance(x, Parser) for x in v):
+                setattr(p, name, type(v)(self.canonical(x) if isinstance(x, Parser) else x for x in v))
+
+    def _key(self, p, skip=None):
+        attrs = tuple(sorted((name, self._value_key(v, p)) for (name, v) in vars(p).items()
+                             if name not in _RUNTIME_ATTRIBUTES and name != skip))
+        return (type(p), attrs)
+
+    def _value_key(self, v, owner):
+        if v is owner:
+            return _SELF
+        if isinstance(v, Parser):
+            return ('parser', id(self.canonical(v)))
+        if isinstance(v, (list, tuple)):
+            return (type(v), tuple(self._value_key(x, owner) for x in v))
+        if isinstance(v, types.FunctionType):
+            cells = tuple(self._cell_key(c, owner) for c in (v.__closure__ or ()))
+            defaults = self._value_key((v.__defaults__ or (),
+                                        tuple(sorted((v.__kwdefaults__ or {}).items()))), owner)
+            return ('function', v.__code__, defaults, cells)
+        if hasattr(v, 'pattern') and hasattr(v, 'flags'):
+            return ('regex', v.pattern, v.flags)
+        if isinstance(v, (set, frozenset)):
+            return ('set', frozenset(v))
+        try:
+            hash(v)
+        except TypeError:
+            # Mutable values are only equal to themselves.
+            self._seen.append(v)
+            return ('id', id(v))
+        return ('value', type(v), v)
+
+    def _cell_key(self, cell, owner):
+        try:
+            return self._value_key(cell.cell_contents, owner)
+        except ValueError:
+            # Empty cell.
+            return ('id', id(cell))
+
+def intern(parser):
+    """Share structurally equal parsers in the graph reachable from parser. The graph is
+    modified in place; returns the canonical version of parser, which should be used
+    instead of it."""
+    return _Interner().canonical(parser)
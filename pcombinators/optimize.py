@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Grammar optimization, with an on-disk cache for the results.
+
+optimize() computes the FIRST sets of all branches of every FirstAlternative (see
+pcombinators.analysis) and installs them as dispatch tables, so that branches which
+can't match the next character are skipped without being called. The grammar is
+interned first (see pcombinators.intern): grammars built by functions contain many
+copies of the same parsers, which would otherwise not all get tables.
+
+Computing the tables means analyzing the whole grammar, which is too expensive for
+short-lived processes building their grammar at import time. With a cache directory,
+the tables are stored in a file keyed by a hash of the grammar's structure and the
+library version, and loaded from there by later processes. Computing the key only
+walks the grammar once, which costs a fraction of the analysis. Only data is stored, not
+parsers (which would include unpicklable lambdas): the tables are attached to the
+freshly built grammar, whose structure is guaranteed to match by the key.
+
+Example:
+    parser = optimize(Value(), cache_dir='/var/cache/myapp')
+
+@author: lbo
+"""
+
+import functools
+import hashlib
+import itertools
+import marshal
+import os
+import sys
+import tempfile
+
+import pcombinators
+from pcombinators.analysis import Grammar, FirstSet
+from pcombinators.combinators import Parser, FirstAlternative, _RUNTIME_ATTRIBUTES
+from pcombinators.intern import intern
+
+def _describe_value(v):
+    """A stable description of a non-parser attribute, for the grammar key."""
+    if callable(v) and hasattr(v, '__code__'):
+        code = v.__code__
+        return ('fn', v.__qualname__, code.co_code, _describe_consts(code.co_consts))
+    if isinstance(v, (set, frozenset)):
+        return ('set', tuple(sorted(repr(x) for x in v)))
+    if hasattr(v, 'pattern'):
+        return ('rx', v.pattern, v.flags)
+    if isinstance(v, (str, int, float, bool, type(None), bytes)):
+        return v
+    return ('type', type(v).__qualname__)
+
+def _describe_consts(consts):
+    return tuple(c.co_code if hasattr(c, 'co_code') else _describe_value(c) for c in consts)
+
+@functools.lru_cache(maxsize=None)
+def _class_parsers(t):
+    """Names of parser-valued class attributes of t, as found by Parser.children().
+    Class attributes are looked up once per class."""
+    names, seen = [], set()
+    for c in t.__mro__:
+        for name, v in vars(c).items():
+            if name not in seen:
+                seen.add(name)
+                if isinstance(v, Parser) or (isinstance(v, (list, tuple)) and
+                                             any(isinstance(x, Parser) for x in v)):
+                    names.append(name)
+    return names
+
+def _walk(parser):
+    """Return all parser instances reachable from parser, in depth-first order, and
+    their children.
+
+    This is much cheaper than building a Grammar, which makes checking the cache
+    cheaper than analyzing the grammar. Unlike Grammar, every instance is a node of
+    its own, so the grammar must be interned (otherwise, resolving Lazy parsers may
+    create new instances forever)."""
+    parsers, children = [], {}
+    stack = [parser]
+    while stack:
+        p = stack.pop()
+        if id(p) in children:
+            continue
+        t = type(p)
+        if t.children is not Parser.children:
+            found = p.children()
+        else:
+            # Like Parser.children(), without going through all methods every time.
+            names = _class_parsers(t)
+            attrs = vars(p)
+            found = []
+            for v in itertools.chain(attrs.values(), (getattr(t, n) for n in names if n not in attrs)):
+                if isinstance(v, Parser):
+                    found.append(v)
+                elif isinstance(v, (list, tuple)):
+                    found.extend(x for x in v if isinstance(x, Parser))
+        parsers.append(p)
+        children[id(p)] = found
+        stack.extend(reversed(found))
+    return parsers, children
+
+def _key(parsers, children):
+    index = {id(p): i for (i, p) in enumerate(parsers)}
+    nodes = []
+    for p in parsers:
+        attrs = tuple((name, _describe_value(v)) for (name, v) in sorted(vars(p).items())
+                      if not (name.startswith('__') or name in _RUNTIME_ATTRIBUTES))
+        nodes.append((type(p).__module__, type(p).__qualname__, attrs,
+                      tuple(index[id(c)] for c in children[id(p)])))
+    h = hashlib.sha256('{} {}'.format(pcombinators.__version__, sys.version_info[:2]).encode())
+    h.update(repr(nodes).encode('utf-8', 'surrogatepass'))
+    return h.hexdigest()
+
+def grammar_key(parser):
+    """Return a hex digest identifying the structure of the (interned) grammar reachable
+    from parser, the library version and the Python version (which the marshal format
+    depends on)."""
+    return _key(*_walk(parser))
+
+def _alternatives(parsers):
+    return [p for p in parsers if isinstance(p, FirstAlternative)]
+
+def _compute_tables(parser, parsers):
+    grammar = Grammar(parser)
+    tables = []
+    for alt in _alternatives(parsers):
+        guards = []
+        for branch in alt._parsers:
+            first = grammar.first(branch)
+            if first is None or grammar.nullable(branch):
+                guards.append(None)
+            else:
+                guards.append([''.join(sorted(first.chars)), first.negated])
+        tables.append(guards)
+    return tables
+
+def _install(parsers, tables):
+    alternatives = _alternatives(parsers)
+    assert len(alternatives) == len(tables), 'BUG: dispatch tables don\'t match grammar'
+    for alt, guards in zip(alternatives, tables):
+        if all(g is None for g in guards):
+            continue
+        alt._guards = [None if g is None else FirstSet(g[0], g[1]) for g in guards]
+        alt._dispatch = {}
+
+def _load(path):
+    try:
+        with open(path, 'rb') as f:
+            return marshal.load(f)
+    except (OSError, ValueError, EOFError, TypeError):
+        return None
+
+def _store(path, tables):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # Write to a temporary file first, so that concurrent processes never read partial files.
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        marshal.dump(tables, f)
+    os.replace(tmp, path)
+
+def optimize(parser, cache_dir=None):
+    """Intern the grammar reachable from parser and install dispatch tables on all its
+    FirstAlternatives. If cache_dir is given, tables are loaded from/stored to it.
+    Returns the canonical version of parser, which should be used instead of it."""
+    parser = intern(parser)
+    parsers, children = _walk(parser)
+    tables = None
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, 'grammar-{}.bin'.format(_key(parsers, children)))
+        tables = _load(path)
+    if tables is None:
+        tables = _compute_tables(parser, parsers)
+        if cache_dir is not None:
+            _store(path, tables)
+    _install(parsers, tables)
+    return parser
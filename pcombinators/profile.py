@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-parser profiling counters.
+
+Example:
+    prof = Profiler()
+    result, st = prof.run(parser, ParseState(text))
+    print(prof.report())
+
+or, to profile a grammar over many parse calls:
+
+    prof = Profiler().install(parser)
+    ... parse as usual ...
+    prof.uninstall()
+    print(prof.report())
+
+When no profiler is installed, parsers run without any overhead.
+
+StackTracer records which paths through the grammar are hot, for flamegraphs.
+
+@author: lbo
+"""
+
+import signal
+import time
+
+from pcombinators.combinators import Lazy
+from pcombinators.instrument import Instrumentation, describe
+
+class ParserStats:
+    """Counters for a single parser.
+
+    consumed counts the characters consumed by successful parses; backtracked
+    counts characters that were consumed and then given up again by reset() while
+    this parser was the innermost active one. cumulative is the time spent in the
+    parser including its children (counting recursive calls only once), self_time
+    excludes time spent in children.
+    """
+
+    def __init__(self, parser):
+        self.parser = parser
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.consumed = 0
+        self.backtracked = 0
+        self.cumulative = 0.
+        self.self_time = 0.
+        self._active = 0
+
+    def name(self):
+        return describe(self.parser)
+
+    def __repr__(self):
+        return 'ParserStats({}, calls={}, self={:.6f}s)'.format(self.name(), self.calls, self.self_time)
+
+class Profiler(Instrumentation):
+    """Collects ParserStats for every parser reachable from the instrumented parser."""
+
+    def __init__(self):
+        super().__init__()
+        # parser -> ParserStats
+        self.stats = {}
+        # Active calls as [stats, time spent in children].
+        self._stack = []
+        self._states = []
+
+    def wrap(self, parser, parse):
+        stats = self.stats.get(parser)
+        if stats is None:
+            stats = self.stats[parser] = ParserStats(parser)
+        stack = self._stack
+        clock = time.perf_counter
+        def profiled(st):
+            if 'reset' not in vars(st):
+                self._watch(st)
+            stats.calls += 1
+            stats._active += 1
+            initial = st.index()
+            frame = [stats, 0.]
+            stack.append(frame)
+            before = clock()
+            try:
+                r, st2 = parse(st)
+            finally:
+                elapsed = clock() - before
+                stack.pop()
+                stats._active -= 1
+                if stats._active == 0:
+                    stats.cumulative += elapsed
+                stats.self_time += elapsed - frame[1]
+                if stack:
+                    stack[-1][1] += elapsed
+            if r is None:
+                stats.failures += 1
+            else:
+                stats.successes += 1
+                stats.consumed += st2.index() - initial
+            return r, st2
+        return profiled
+
+    def _watch(self, st):
+        """Count characters discarded by st.reset() for the innermost active parser."""
+        reset = st.reset
+        stack = self._stack
+        def counting_reset(hold):
+            if stack:
+                stack[-1][0].backtracked += st.index() - hold.total_index
+            return reset(hold)
+        st.reset = counting_reset
+        self._states.append(st)
+
+    def uninstall(self):
+        super().uninstall()
+        for st in self._states:
+            if 'reset' in vars(st):
+                del st.reset
+        self._states = []
+
+    SORT_KEYS = ('self_time', 'cumulative', 'calls', 'failures', 'backtracked', 'consumed')
+
+    def sorted_stats(self, key='self_time'):
+        """Return the collected ParserStats, sorted by the given attribute (descending)."""
+        assert key in self.SORT_KEYS, 'unknown sort key {}'.format(key)
+        return sorted(self.stats.values(), key=lambda s: getattr(s, key), reverse=True)
+
+    def report(self, key='self_time', limit=None):
+        """Format the collected statistics as table, sorted by key (see SORT_KEYS)."""
+        lines = ['{:<24} {:<20} {:>9} {:>9} {:>9} {:>10} {:>10} {:>10} {:>10}'.format(
+            'parser', 'class', 'calls', 'success', 'fail', 'consumed', 'backtrack', 'cum ms', 'self ms')]
+        for s in self.sorted_stats(key)[:limit]:
+            lines.append('{:<24} {:<20} {:>9} {:>9} {:>9} {:>10} {:>10} {:>10.3f} {:>10.3f}'.format(
+                s.parser._name or '', type(s.parser).__name__, s.calls, s.successes, s.failures,
+                s.consumed, s.backtracked, s.cumulative * 1e3, s.self_time * 1e3))
+        return '\n'.join(lines)
+
+class StackTracer(Instrumentation):
+    """Records the stacks of active parsers, for export as collapsed stacks.
+
+    The output of collapsed() can be read by flamegraph tools (e.g. flamegraph.pl or
+    speedscope). Frames are named by describe(); plain Lazy wrappers are transparent
+    and don't appear in stacks, but recursion through them does (as repeated frames).
+
+    By default, every call is timed, and stacks are weighted by the self time of their
+    innermost parser in microseconds. With `interval` (in seconds), the tracer instead
+    samples the active stack from a SIGPROF timer and weights stacks by number of samples.
+    This is a lot cheaper on large inputs, but only works on Unix and in the main thread.
+
+    Example:
+        tracer = StackTracer()
+        tracer.run(parser, ParseState(text))
+        with open('parse.folded', 'w') as f:
+            tracer.write(f)
+    """
+
+    def __init__(self, interval=None):
+        super().__init__()
+        self.interval = interval
+        # Collapsed stack -> weight
+        self.counts = {}
+        self._names = []
+        self._child_time = []
+        self._previous_handler = None
+
+    def wrap(self, parser, parse):
+        if type(parser) is Lazy and parser._name is None:
+            return parse
+        name = describe(parser).replace(';', ':').replace(' ', '_')
+        names = self._names
+        if self.interval is not None:
+            def traced(st):
+                names.append(name)
+                try:
+                    return parse(st)
+                finally:
+                    names.pop()
+            return traced
+
+        counts = self.counts
+        child_time = self._child_time
+        clock = time.perf_counter
+        def timed(st):
+            names.append(name)
+            child_time.append(0.)
+            before = clock()
+            try:
+                return parse(st)
+            finally:
+                elapsed = clock() - before
+                stack = ';'.join(names)
+                counts[stack] = counts.get(stack, 0.) + (elapsed - child_time.pop()) * 1e6
+                names.pop()
+                if child_time:
+                    child_time[-1] += elapsed
+        return timed
+
+    def install(self, parser):
+        if self.interval is not None and self._previous_handler is None:
+            self._previous_handler = signal.signal(signal.SIGPROF, self._sample)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        return super().install(parser)
+
+    def uninstall(self):
+        if self._previous_handler is not None:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, self._previous_handler)
+            self._previous_handler = None
+        super().uninstall()
+
+    def _sample(self, signum, frame):
+        if self._names:
+            stack = ';'.join(self._names)
+            self.counts[stack] = self.counts.get(stack, 0) + 1
+
+    def collapsed(self):
+        """Return the recorded stacks as lines of collapsed-stack format ("a;b;c weight")."""
+        lines = []
+        for stack, weight in sorted(self.counts.items()):
+            weight = int(round(weight))
+            if weight > 0:
+                lines.append('{} {}'.format(stack, weight))
+        return lines
+
+    def write(self, f):
+        """Write collapsed stacks to the file object f."""
+        for line in self.collapsed():
+            f.write(line + '\n')
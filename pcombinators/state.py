@@ -7,6 +7,80 @@ Created on Wed May 22 21:41:32 2019
 """
 
 import io
+import time
+
+class ParseException(Exception):
+    pass
+
+class CommitError(ParseException):
+    """Raised when a parse fails after passing a Commit() point, or when a parser tries to
+    backtrack to a position before it."""
+    pass
+
+class ParseBudgetExceeded(ParseException):
+    """Raised when a parse exceeds the budget set by set_budget().
+
+    index is the position at which the parse was aborted, furthest the furthest
+    position seen during the parse (sampled at every budget check)."""
+
+    def __init__(self, msg, index, furthest, steps, elapsed):
+        super().__init__('{} (at index {}, furthest {}, after {} steps, {:.3f}s)'.format(
+            msg, index, furthest, steps, elapsed))
+        self.index = index
+        self.furthest = furthest
+        self.steps = steps
+        self.elapsed = elapsed
+
+class _Budget:
+    """Counts steps on a state, and checks limits every CHECK_INTERVAL steps."""
+
+    CHECK_INTERVAL = 64
+    METHODS = ('hold', 'next', 'advance')
+
+    def __init__(self, st, max_steps, timeout):
+        self.st = st
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.started = time.monotonic()
+        self.steps = 0
+        self.furthest = st.index()
+        self.next_check = self._next_check()
+
+    def install(self):
+        for name in self.METHODS:
+            setattr(self.st, name, self._counting(getattr(self.st, name)))
+
+    @staticmethod
+    def uninstall(st):
+        for name in _Budget.METHODS:
+            if name in vars(st):
+                delattr(st, name)
+
+    def _counting(self, method):
+        def counted(*args):
+            self.steps += 1
+            if self.steps >= self.next_check:
+                self.check()
+            return method(*args)
+        return counted
+
+    def _next_check(self):
+        n = self.steps + self.CHECK_INTERVAL
+        if self.max_steps is not None:
+            n = min(n, self.max_steps + 1)
+        return n
+
+    def check(self):
+        index = self.st.index()
+        self.furthest = max(self.furthest, index)
+        self.next_check = self._next_check()
+        elapsed = time.monotonic() - self.started
+        if self.max_steps is not None and self.steps > self.max_steps:
+            raise ParseBudgetExceeded('step budget of {} exceeded'.format(self.max_steps),
+                                      index, self.furthest, self.steps, elapsed)
+        if self.timeout is not None and elapsed > self.timeout:
+            raise ParseBudgetExceeded('deadline of {}s exceeded'.format(self.timeout),
+                                      index, self.furthest, self.steps, elapsed)
 
 def ps(s):
     """Wrap a string in a ParseState, making it suitable for parsing."""
@@ -15,6 +89,9 @@ def ps(s):
 class _State:
     """Generic parsing state representation."""
 
+    # Incremented by commit(); holds taken before are invalidated.
+    _epoch = 0
+
     def next(self):
         pass
 
@@ -46,11 +123,16 @@ class _State:
         self._holds.append(self.index())
         hold = _State.ParserHold()
         hold.total_index = self.index()
+        hold.epoch = self._epoch
         return hold
 
     def release(self, hold):
         """Release a hold. Generally called when a parser was successful."""
         assert hold.total_index >= 0, 'BUG: double reset/release'
+        if hold.epoch != self._epoch:
+            # Already dropped by commit().
+            hold.total_index = -1
+            return
         assert self._holds[-1] == hold.total_index, 'BUG: releasing bad ordered hold'
         self._holds.pop()
         self._maybe_collect()
@@ -62,11 +144,41 @@ class _State:
         # It is possible that a caller accidentally released a hold that it
         # now wants to reset to.
         assert hold.total_index >= 0, 'BUG: double reset/release'
+        self._check_committed(hold)
         assert self._holds[-1] == hold.total_index, 'BUG: reset/release in bad order'
         self._reset_index(hold.total_index)
         self._holds.pop()
         hold.total_index = -2
 
+    def commit(self):
+        """Drop all holds: parsers promise not to backtrack to before the current position
+        anymore. Later attempts to reset() to a dropped hold raise CommitError.
+
+        Used by the Commit() parser."""
+        self._holds = []
+        self._epoch += 1
+        self._maybe_collect()
+
+    def set_budget(self, max_steps=None, timeout=None):
+        """Bound the work spent parsing this state: after max_steps steps or timeout seconds,
+        the parse is aborted with ParseBudgetExceeded. A step is a call to hold(), next()
+        or advance(), i.e. a backtracking point or consumed input. Limits are checked every
+        _Budget.CHECK_INTERVAL steps. Calling set_budget() without limits removes the budget;
+        states without budget don't pay for it. Returns self.
+
+        Example:
+            parser.parse(ps(untrusted).set_budget(max_steps=100000, timeout=.1))
+        """
+        _Budget.uninstall(self)
+        if max_steps is not None or timeout is not None:
+            _Budget(self, max_steps, timeout).install()
+        return self
+
+    def _check_committed(self, hold):
+        if hold.epoch != self._epoch:
+            raise CommitError('cannot backtrack from {} to index {}: parse was committed'.format(
+                self.index(), hold.total_index))
+
     def __iter__(self):
         return self
 
@@ -79,8 +191,25 @@ class _State:
     def remaining(self, nmin):
         raise NotImplementedError()
 
-    class ParseException(Exception):
-        pass
+    def window(self, start, end=None):
+        """Return a state parsing only the input from start to end; see ParseState.window().
+        Only states with the whole input in memory support this."""
+        raise NotImplementedError('window() is not supported by {}'.format(type(self).__name__))
+
+    def match(self, rx, lookahead=None):
+        """Match the compiled regular expression rx at the current position, without
+        advancing. Returns a match object or None; the matched length is
+        m.end() - m.start(). Depending on the state, rx may see the input before the
+        current position, so ^, \\b and lookbehinds are not reliable; use it for
+        expressions without them.
+
+        lookahead is a hint for states tracking which input was examined: rx doesn't
+        look at characters at or beyond (end of match + lookahead), or (current
+        position + lookahead) if it fails. None means unknown.
+        """
+        return rx.match(self.remaining())
+
+    ParseException = ParseException
 
     def error(self, msg):
         raise ParseException(msg)
@@ -145,8 +274,8 @@ class ParseFileState(_State):
     PREFILL = 256
 
     def fill_buffer(self, min=0):
-        if len(self._buf)-self._index <= min:
-            new = self._fobj.read(self.PREFILL)
+        while len(self._buf)-self._index <= min and not self._stream_finished:
+            new = self._fobj.read(max(self.PREFILL, min))
             self._buf.extend(new)
             if len(new) == 0:
                 self._stream_finished = True
@@ -165,7 +294,7 @@ class ParseFileState(_State):
         return self._buf[self._index-1]
 
     def advance(self, n):
-        self.fill_buffer(self._index + n)
+        self.fill_buffer(n)
         self._index += n
 
     def remaining(self, nmin=-1):
@@ -174,6 +303,19 @@ class ParseFileState(_State):
             return ''.join(self._buf[self._index:])
         return ''.join(self._buf[self._index:self._index+nmin])
 
+    def match(self, rx, lookahead=None):
+        # Match on a window of the buffer; if the match may depend on input beyond
+        # the window, retry with a larger one. Without lookahead hint, the match
+        # must end in the first half of the window.
+        n = self.PREFILL
+        while True:
+            text = self.remaining(n)
+            m = rx.match(text)
+            margin = n // 2 if lookahead is None else lookahead
+            if len(text) < n or m is None or m.end() + margin <= len(text):
+                return m
+            n *= 2
+
     def len(self):
         print('warning: len() is inaccurate on ParseFileState, returning only past and present state')
         return self._total_offset + len(self._buf)
@@ -190,13 +332,28 @@ class ParseState(_State):
         self._holds = []
         self._input = s
         self._index = 0
+        # Bounds of the parsed part of s; see window().
+        self._start = 0
+        self._end = len(s)
 
     def __repr__(self):
-        if self._index < len(self._input):
+        if self._index < self._end:
             return 'ParseState({}< {} >{})'.format(
-                    self._input[0:self._index], self._input[self._index], self._input[self._index+1:])
+                    self._input[0:self._index], self._input[self._index], self._input[self._index+1:self._end])
         else:
-            return 'ParseState({}<>)'.format(self._input)
+            return 'ParseState({}<>)'.format(self._input[0:self._end])
+
+    def window(self, start, end=None):
+        """Return a ParseState for the part of the input from start to end (by default,
+        the end of this state), sharing the input string instead of copying it.
+        Positions like index() are the same as in this state."""
+        end = self._end if end is None else end
+        if not self._start <= start <= end <= self._end:
+            raise ValueError('window {}:{} is outside of {}:{}'.format(start, end, self._start, self._end))
+        w = ParseState(self._input)
+        w._start = w._index = start
+        w._end = end
+        return w
 
     # We override hold/release/reset here because ParseState holds the entire
     # input in memory all the time. Thus we only need to use holds for resets,
@@ -205,6 +362,7 @@ class ParseState(_State):
     def hold(self):
         hold = _State.ParserHold()
         hold.total_index = self.index()
+        hold.epoch = self._epoch
         return hold
 
     def release(self, hold):
@@ -215,6 +373,7 @@ class ParseState(_State):
     def reset(self, hold):
         """Release hold and reset index to its position."""
         assert hold.total_index >= 0, 'double reset'
+        self._check_committed(hold)
         self._index = hold.total_index
         hold.total_index = -2
 
@@ -228,7 +387,7 @@ class ParseState(_State):
         self._index += n
 
     def peek(self):
-        if self._index < len(self._input):
+        if self._index < self._end:
             return self._input[self._index]
         return None
 
@@ -236,7 +395,7 @@ class ParseState(_State):
         return self._index
 
     def len(self):
-        return len(self._input)
+        return self._end
 
     def __iter__(self):
         return self
@@ -245,11 +404,14 @@ class ParseState(_State):
         return self.next()
 
     def finished(self):
-        return self._index == len(self._input)
+        return self._index == self._end
+
+    def match(self, rx, lookahead=None):
+        return rx.match(self._input, self._index, self._end)
 
     def remaining(self, nmin=-1):
         if self.finished():
             return ''
         if nmin == -1:
-            return self._input[self._index:]
-        return self._input[self._index:self._index+nmin]
\ No newline at end of file
+            return self._input[self._index:self._end]
+        return self._input[self._index:min(self._index+nmin, self._end)]
\ No newline at end of file
@@ -6,9 +6,12 @@ Let's test the combinators in a real world application!
 @author: lbo
 """
 
+import functools
+
 from pcombinators.state import ParseState
 from pcombinators.combinators import *
 from pcombinators.primitives import *
+from pcombinators.intern import intern
 
 def Operator(set):
     """An operator or parenthesis."""
@@ -29,25 +32,22 @@ def Atom():
 def Product():
     return OptimisticSequence(Power(), Operator('*/') + Lazy(Product)) >> operator_result_to_tuple
 
-class Power(Parser):
+# Power and Term refer to themselves. They are Lazy parsers so that tools like the
+# iterative engine can see through them.
+
+class Power(Lazy):
     ops = Operator('^')
 
     def __init__(self):
-        self.p = OptimisticSequence(Lazy(Atom), self.ops + self) >> operator_result_to_tuple
-
-    def parse(self, st):
-        return self.p.parse(st)
+        super().__init__(lambda: OptimisticSequence(Lazy(Atom), self.ops + self) >> operator_result_to_tuple)
 
-class Term(Parser):
+class Term(Lazy):
     ops = Operator('+-')
 
     def __init__(self):
-        self.p = OptimisticSequence(Product(), self.ops + self) >> operator_result_to_tuple
-
-    def parse(self, st):
         # Try to parse a product, then a sum operator, then another term.
         # OptimisticSequence will just return a product if there is no sum operator.
-        return self.p.parse(st)
+        super().__init__(lambda: OptimisticSequence(Product(), self.ops + self) >> operator_result_to_tuple)
 
 
 def operator_result_to_tuple(l):
@@ -66,10 +66,13 @@ def pretty_print(tpl):
     assert len(tpl) == 3
     return '({} {} {})'.format(pretty_print(tpl[0]), tpl[1], pretty_print(tpl[2]))
 
+# Every Parens() contains a new Term graph; interned, all levels of nesting share one.
+_expression = intern(Term().then_skip(EndOfInput()))
+
 def parse(s):
     if type(s) is str:
         s = ParseState(s.replace(' ', ''))
-    parsed, st = Term().then_skip(EndOfInput()).parse(s)
+    parsed, st = _expression.parse(s)
     if parsed is None:
         print('Parse error :(', st)
         return None
@@ -77,4 +80,83 @@ def parse(s):
 
 def parse_and_print(expr):
     """Parse an expression string and return a string of the parsing result."""
-    return pretty_print(parse(expr))
\ No newline at end of file
+    return pretty_print(parse(expr))
+
+# Evaluation
+
+# Arithmetic operators of the grammar, mapped to their Python spelling.
+_PYTHON_OPERATORS = {'+': '+', '-': '-', '*': '*', '/': '/', '^': '**'}
+
+# Variables are renamed in the generated code so that names like `in` or `if`
+# don't clash with Python keywords.
+_VARIABLE_PREFIX = 'v_'
+# Constants are passed to the generated code as variables too: not every float has a
+# literal (e.g. inf).
+_CONSTANT_PREFIX = 'c'
+
+def to_python(tpl, constants):
+    """Translate a parse result (as returned by parse()) into an equivalent Python expression.
+    Numbers are appended to the list constants, and referred to as c0, c1, ..."""
+    if isinstance(tpl, tuple):
+        assert len(tpl) == 3
+        return '({} {} {})'.format(
+            to_python(tpl[0], constants), _PYTHON_OPERATORS[tpl[1]], to_python(tpl[2], constants))
+    if isinstance(tpl, str):
+        return _VARIABLE_PREFIX + tpl
+    constants.append(tpl)
+    return '{}{}'.format(_CONSTANT_PREFIX, len(constants) - 1)
+
+def variables(tpl):
+    """Return the set of variable names occurring in a parse result."""
+    if isinstance(tpl, tuple):
+        return variables(tpl[0]) | variables(tpl[2])
+    if isinstance(tpl, str):
+        return {tpl}
+    return set()
+
+class Expression:
+    """A parsed expression compiled to a Python code object.
+
+    Calling it with a mapping from variable names to values evaluates the
+    expression. The values may be NumPy arrays (or anything else supporting the
+    arithmetic operators), in which case the expression is evaluated vectorized over the
+    whole batch with a single pass through the interpreter.
+
+    Example:
+        >>> e = compile_expression('a * 2 + b')
+        >>> e({'a': numpy.arange(3), 'b': 1})
+        array([1., 3., 5.])
+    """
+
+    def __init__(self, text, tree):
+        self.text = text
+        self.tree = tree
+        self.variables = frozenset(variables(tree))
+        constants = []
+        self.code = compile(to_python(tree, constants), '<arith: {}>'.format(text), 'eval')
+        self._constants = {_CONSTANT_PREFIX + str(i): c for (i, c) in enumerate(constants)}
+
+    def __call__(self, values=None, **kwargs):
+        values = dict(values or {}, **kwargs)
+        missing = self.variables - values.keys()
+        if missing:
+            raise KeyError('unbound variables in {}: {}'.format(self.text, ', '.join(sorted(missing))))
+        names = {_VARIABLE_PREFIX + v: values[v] for v in self.variables}
+        names.update(self._constants)
+        return eval(self.code, {'__builtins__': {}}, names)
+
+    def __repr__(self):
+        return 'Expression({})'.format(self.text)
+
+@functools.lru_cache(maxsize=1024)
+def compile_expression(expr):
+    """Parse and compile an expression string. Results are cached by expression text,
+    so compiling a formula that was seen before is a dictionary lookup."""
+    tree, st = _expression.parse(ParseState(expr.replace(' ', '')))
+    if tree is None:
+        raise ValueError('could not parse expression {!r} (at {})'.format(expr, st))
+    return Expression(expr, tree)
+
+def evaluate(expr, values=None, **kwargs):
+    """Evaluate an expression string with the given variable values (scalars or arrays)."""
+    return compile_expression(expr)(values, **kwargs)
@@ -6,12 +6,155 @@ Created on Fri May 24 23:46:48 2019
 @author: lbo
 """
 
+import array
+
 from pcombinators import *
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 separator = Whitespace() + OneOf(",") + Whitespace()
 string = Skip(String('"')) + NoneInSet('"') + Skip(String('"'))
-integer = Last(Integer() + Skip((Peek(NoneInSet('.')) | EndOfInput())))
+integer = Last(Integer() + Skip((Peek(NoneInSet('.eE')) | EndOfInput())))
 value = integer | Float() | Last(string)
 line = Flatten(Repeat(OptimisticSequence(value, Skip(separator)), -1)).then_skip((String('\n') | EndOfInput()))
 
-file = Repeat(line, -1)
\ No newline at end of file
+file = Repeat(line, -1)
+
+def records(st):
+    """Iterate over the lines of a CSV file without keeping them all in memory."""
+    return line.iterate(st)
+
+# Columnar storage
+
+class StringColumn:
+    """A column of strings, stored as one big string plus offsets instead of one
+    object per value."""
+
+    # Appended strings are joined into a chunk every FLUSH values.
+    FLUSH = 4096
+
+    def __init__(self):
+        self._chunks = []
+        self._pending = []
+        self._offsets = array.array('q', [0])
+
+    def append(self, s):
+        self._pending.append(s)
+        self._offsets.append(self._offsets[-1] + len(s))
+        if len(self._pending) >= self.FLUSH:
+            self._chunks.append(''.join(self._pending))
+            self._pending = []
+
+    def data(self):
+        """Return all values concatenated."""
+        if self._pending or len(self._chunks) > 1:
+            self._chunks = [''.join(self._chunks + self._pending)]
+            self._pending = []
+        return self._chunks[0] if self._chunks else ''
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('StringColumn index out of range')
+        return self.data()[self._offsets[i]:self._offsets[i+1]]
+
+    def __iter__(self):
+        data = self.data()
+        for i in range(len(self)):
+            yield data[self._offsets[i]:self._offsets[i+1]]
+
+    def __repr__(self):
+        return 'StringColumn({})'.format(list(self))
+
+class Columns:
+    """CSV data stored by column: int and float columns as array.array('q'/'d'),
+    string columns as StringColumn.
+
+    schema is a list of column types (int, float or str); int values are accepted in
+    float columns. Without schema, types are inferred from the first row; an int column
+    is converted to float when a float value, or an int that doesn't fit into 64 bits, is
+    appended to it. With schema, this is an error.
+    """
+
+    _TYPECODES = {int: 'q', float: 'd'}
+
+    def __init__(self, schema=None, names=None):
+        self.names = names
+        self.columns = None
+        self.types = None
+        self._inferred = schema is None
+        if schema is not None:
+            self._setup(schema)
+
+    def _setup(self, types):
+        self.types = list(types)
+        self.columns = [StringColumn() if t is str else array.array(self._TYPECODES[t]) for t in self.types]
+
+    def append(self, row):
+        if self.columns is None:
+            self._setup(type(v) for v in row)
+        if len(row) != len(self.columns):
+            raise ValueError('expected {} values, got {}: {}'.format(len(self.columns), len(row), row))
+        for i, (v, t) in enumerate(zip(row, self.types)):
+            if type(v) is not t:
+                if t is float and type(v) is int:
+                    v = float(v)
+                elif t is int and type(v) is float and self._inferred:
+                    self._promote(i)
+                else:
+                    raise ValueError('column {}: expected {}, got {!r}'.format(i, t.__name__, v))
+            try:
+                self.columns[i].append(v)
+            except OverflowError:
+                # An int outside the int64 range.
+                if not (t is int and self._inferred):
+                    raise ValueError('column {}: {} out of range for {}'.format(i, v, t.__name__))
+                self._promote(i)
+                self.columns[i].append(float(v))
+
+    def _promote(self, i):
+        self.columns[i] = array.array('d', self.columns[i])
+        self.types[i] = float
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    def __getitem__(self, key):
+        """Return a column by index or name."""
+        if isinstance(key, str):
+            key = self.names.index(key)
+        return self.columns[key]
+
+    def to_numpy(self):
+        """Return the columns as NumPy arrays. Numeric columns share memory with the arrays."""
+        if numpy is None:
+            raise ImportError('to_numpy() requires numpy')
+        result = []
+        for c, t in zip(self.columns, self.types):
+            if t is str:
+                result.append(numpy.array(list(c)))
+            else:
+                result.append(numpy.frombuffer(c, dtype=numpy.int64 if t is int else numpy.float64))
+        return result
+
+def parse_columns(st, schema=None, header=False):
+    """Parse a CSV file into Columns. If header is true, the first line contains column names.
+    Empty lines are skipped. Raises ValueError if a line can't be parsed."""
+    it = records(st)
+    names = None
+    if header:
+        names = next(it, None)
+    columns = Columns(schema, names)
+    for row in it:
+        if row:
+            columns.append(row)
+    if not st.finished():
+        raise ValueError('invalid CSV line at position {}'.format(st.index()))
+    return columns
@@ -8,14 +8,15 @@ Example on how to write a JSON parser.
 
 from pcombinators.combinators import *
 from pcombinators.primitives import *
+from pcombinators.intern import intern
 import pcombinators.state as st
 import pcombinators.util as ut
 
-JString = Last(Skip(String('"')) + NoneInSet('"') + Skip(String('"')))
+JString = Last(Skip(String('"')) + NoneInSet('"') + Skip(String('"'))).named('JString')
 
 example_json = '{"id":1,"name":"Foo","price":123,"tags":["Bar","Eek"],"stock":{"warehouse":300,"retail":20}}'
 
-class Value(Parser):
+class Value(Lazy):
     """Bare-bones, but fully functioning, JSON parser. Doesn't like escaped quotes.
 
     Example:
@@ -27,8 +28,9 @@ class Value(Parser):
           'stock': {'warehouse': 300.0, 'retail': 20.0}},
          ParseState({"id":1,"name":"Foo","price":123,"tags":["Bar","Eek"],"stock":{"warehouse":300,"retail":20}}<>))
     """
-    def parse(self, st):
-        return (Dict | List | JString | Float()).parse(st)
+    def __init__(self):
+        # Dict and List are defined in terms of Value(), so refer to them lazily.
+        super().__init__(lambda: _value)
 
 # We moved out all the piece parsers out of functions to reduce allocation overhead.
 # It improves performance by roughly 2x.
@@ -36,14 +38,13 @@ class Value(Parser):
 # LISTS
 
 # An entry is any value.
-entry = Last(Value() + Skip(String(',') | Nothing()))
-# A list is a [, followed by mid entries, followed by a final entry, and a
-# closing ]. The list is wrapped in a list to prevent merging in other parsers.
-# Flatten() takes care that the list from Repeat() and the single entry are made
-# into one list.
+list_entry = Last(Value() + Skip(String(',') | Nothing())).named('list_entry')
+# A list is a [, followed by entries and a closing ]. Once we have seen the [,
+# nothing else can match: commit (~) to parsing a list, so that the input doesn't have to
+# be kept around for backtracking. `>> list` turns an empty Repeat() into an empty list.
 List = Last(Skip(String('[')) +
-        Repeat(entry, -1) +
-        Skip(String(']')))
+        ~(Repeat(list_entry, -1) >> list) +
+        Skip(String(']'))).named('List')
 
 # DICTS
 
@@ -51,20 +52,35 @@ List = Last(Skip(String('[')) +
 separator = Skip(String(":"))
 # Entry is a String followed by a separator and a value. Wrap the value in a list to prevent merging.
 # The two-element list is converted to a tuple.
-entry = JString + separator + (Value()) >> (lambda l: tuple(l))
+dict_entry = (JString + separator + (Value()) >> (lambda l: tuple(l))).named('dict_entry')
 # A mid entry is followed by a comma.
-midentry = Last(entry + Skip(String(',') | Nothing()))
-# A dict is a {, followed by entries, followed by a final entry, followed by a closing }
-dct = Flatten(
-        Skip(String("{")) + Repeat(midentry, -1) + Skip(String("}")))
+midentry = Last(dict_entry + Skip(String(',') | Nothing()))
+# A dict is a {, followed by entries, followed by a closing }. Like lists, commit after
+# the opening brace.
+dct = Last(
+        Skip(String("{")) + ~(Repeat(midentry, -1) >> list) + Skip(String("}")))
 # Convert the list of tuples into a dict.
-Dict = dct >> dict
+Dict = (dct >> dict).named('Dict')
+
+# Any JSON value.
+_value = Dict | List | JString | Float()
+# Share the parsers that the pieces above build repeatedly, like String(',') | Nothing().
+# (This resolves the Value() parsers, so it must come after the definition of _value.)
+_value = intern(_value)
 
 def parse_json(json):
     if type(json) is str:
         json = st.ParseState(ut.remove_unused_whitespace(json))
     return Value().parse(json)
 
+def parse_json_file(f):
+    """Parse JSON from a file name or text file object. The file is read in chunks, and
+    whitespace is removed while reading, so large files don't need to fit into memory."""
+    if type(f) is str:
+        with open(f, 'r') as fobj:
+            return parse_json_file(fobj)
+    return Value().parse(st.ParseFileState(ut.WhitespaceFilter(f)))
+
 def json_result(json):
     r, st = parse_json(json)
     return r
\ No newline at end of file
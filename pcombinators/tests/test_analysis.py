@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: lbo
+"""
+
+import unittest
+
+import pcombinators.tests.arith as arith
+import pcombinators.tests.csv as csv
+import pcombinators.tests.json as js
+from pcombinators.analysis import analyze, Grammar, FirstSet
+from pcombinators.combinators import *
+from pcombinators.primitives import *
+
+def kinds(p):
+    return sorted(f.kind for f in analyze(p))
+
+class AnalysisTest(unittest.TestCase):
+
+    def test_examples(self):
+        self.assertEqual(kinds(js.Value()), [])
+        self.assertEqual(kinds(arith.Term()), [])
+        # integer | Float() | ...
+        self.assertEqual(kinds(csv.file), ['first-overlap'])
+
+    def test_first_sets(self):
+        g = Grammar(js.Value())
+        first = g.first(g.root)
+        for c in '{["-0123456789':
+            self.assertIn(c, first)
+        self.assertNotIn('a', first)
+        self.assertFalse(g.nullable(g.root))
+        g = Grammar(Regex('[a-c]+x') | Regex('(y|z)?w'))
+        self.assertEqual(g.first(g.root), FirstSet('abcyzw'))
+        digits = Regex(r'\d')
+        self.assertIsNone(Grammar(digits).first(digits))
+
+    def test_nullable_loop(self):
+        findings = analyze(Skip(String('a')) + Repeat(Whitespace(), -1))
+        self.assertEqual([f.kind for f in findings], ['nullable-loop'])
+        self.assertEqual(findings[0].path, ['AtomicSequence', 'Repeat'])
+        self.assertEqual(kinds(Repeat(CharSet('ab'), -1)), [])
+
+    def test_left_recursion(self):
+        expr = Lazy(lambda: grammar)
+        grammar = (expr + String('+') + Float()) | Float()
+        self.assertIn('left-recursion', kinds(grammar))
+        right = Lazy(lambda: grammar2)
+        grammar2 = (Float() + String('+') + right) | Float()
+        self.assertNotIn('left-recursion', kinds(grammar2))
+
+    def test_common_prefix(self):
+        p = (Skip(Whitespace()).then(String('a'))) | (Skip(Whitespace()).then(String('b')))
+        self.assertEqual(kinds(p), ['common-prefix', 'first-overlap'])
+        # Same as for intern(): functions with different closures differ.
+        def add(n):
+            return lambda x: x + n
+        p = ((Integer() >> add(1)) + String('a')) | ((Integer() >> add(2)) + String('b'))
+        self.assertEqual(kinds(p), ['first-overlap'])
+        p = ((Integer() >> add(1)) + String('a')) | ((Integer() >> add(1)) + String('b'))
+        self.assertEqual(kinds(p), ['common-prefix', 'first-overlap'])
+        # The grammar isn't modified.
+        self.assertIsNot(p._parsers[0]._parsers[0], p._parsers[1]._parsers[0])
+
+if __name__ == '__main__':
+    unittest.main()
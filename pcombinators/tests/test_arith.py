@@ -6,12 +6,18 @@ Created on Sat May 25 22:09:49 2019
 @author: lbo
 """
 
+import contextlib
 import io
 import unittest
 
 import pcombinators.state as st
 import pcombinators.tests.arith as arith
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 class TestArith(unittest.TestCase):
 
     def test_simple_addition(self):
@@ -71,6 +77,31 @@ class TestArith(unittest.TestCase):
             h = h.replace(' ', '')
             self.assertEqual(arith.parse(st.ParseFileState(io.StringIO(h))), w)
 
+    def test_evaluate(self):
+        self.assertEqual(arith.evaluate('1 + 2 * 3'), 7.)
+        self.assertEqual(arith.evaluate('a ^ (b - 1)', a=2, b=4), 8.)
+        self.assertEqual(arith.evaluate('in / 4', {'in': 2}), .5)
+        self.assertRaises(KeyError, arith.evaluate, 'a + b', a=1)
+        # Constants without Python literal.
+        self.assertEqual(arith.evaluate('1e999 + 1'), float('inf'))
+        self.assertEqual(arith.evaluate('-1e999 * c0', c0=2), float('-inf'))
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            self.assertRaises(ValueError, arith.compile_expression, '1 +')
+        self.assertEqual('', out.getvalue())
+
+    def test_compile_cache(self):
+        e = arith.compile_expression('x * 2')
+        self.assertIs(e, arith.compile_expression('x * 2'))
+        self.assertEqual(e.variables, {'x'})
+        self.assertEqual(e(x=21), 42)
+
+    @unittest.skipIf(numpy is None, 'numpy not installed')
+    def test_evaluate_vectorized(self):
+        x = numpy.arange(4.)
+        got = arith.evaluate('x ^ 2 - x / 2', x=x)
+        self.assertEqual(list(got), [v ** 2 - v / 2 for v in x])
+
 if __name__ == '__main__':
     st.ParseFileState.COLLECT_LOWER_LIMIT = 0
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: lbo
+"""
+
+import io
+import unittest
+
+import pcombinators.engine as engine
+import pcombinators.state as st
+import pcombinators.tests.json as js
+from pcombinators.cache import CachedParser
+from pcombinators.primitives import *
+
+class CachedParserTest(unittest.TestCase):
+
+    def test_hits(self):
+        p = CachedParser(js.Value())
+        for i in range(3):
+            r, s = p.parse(st.ps(js.example_json))
+            self.assertEqual(['Bar', 'Eek'], r['tags'])
+            self.assertTrue(s.finished())
+        self.assertEqual((None, 'x'), (p.parse(st.ps('x'))[0], p.parse(st.ps('x'))[1].remaining()))
+        info = p.cache_info()
+        self.assertEqual((3, 2, 2), (info.hits, info.misses, info.currsize))
+        p.cache_clear()
+        self.assertEqual((0, 0, 0, 0), (p.cache_info().hits, p.cache_info().misses,
+                                        p.cache_info().currsize, p.cache_info().bytes))
+
+    def test_position(self):
+        p = CachedParser(Integer())
+        s = st.ps('12+12')
+        self.assertEqual(12, p.parse(s)[0])
+        s.advance(1)
+        self.assertEqual((12, 5), (p.parse(s)[0], s.index()))
+        self.assertEqual(2, p.cache_info().misses)
+        self.assertEqual(12, p.parse(st.ps('12+12').window(3))[0])
+        self.assertEqual(1, p.cache_info().hits)
+
+    def test_eviction(self):
+        p = CachedParser(Integer(), maxsize=2)
+        for s in ['1', '2', '1', '3', '2']:
+            p.parse(st.ps(s))
+        # '2' was evicted when '3' was added.
+        self.assertEqual((1, 4, 2), p.cache_info()[:2] + (p.cache_info().currsize,))
+        p = CachedParser(Integer(), maxbytes=5)
+        for s in ['111', '22', '3', '444444']:
+            p.parse(st.ps(s))
+        self.assertEqual((2, 3), (p.cache_info().currsize, p.cache_info().bytes))
+
+    def test_hashed(self):
+        p = CachedParser(js.Value())
+        p.HASH_THRESHOLD = 10
+        p.parse(st.ps(js.example_json))
+        self.assertEqual(1.0, p.parse(st.ps(js.example_json))[0]['id'])
+        self.assertEqual([bytes], [type(k) for k in p._entries])
+
+    def test_modes(self):
+        p = CachedParser(js.Value())
+        p.parse(st.ps(js.example_json))[0]['tags'].append('x')
+        p.parse(st.ps(js.example_json))[0]['tags'].append('y')
+        self.assertEqual(['Bar', 'Eek'], p.parse(st.ps(js.example_json))[0]['tags'])
+        p = CachedParser(js.Value(), mode='freeze')
+        r = p.parse(st.ps(js.example_json))[0]
+        self.assertEqual(('Bar', 'Eek'), r['tags'])
+        with self.assertRaises(TypeError):
+            r['id'] = 2
+        self.assertIs(r, p.parse(st.ps(js.example_json))[0])
+        with self.assertRaises(ValueError):
+            CachedParser(js.Value(), mode='frozen')
+
+    def test_file_state(self):
+        p = CachedParser(js.Value())
+        self.assertEqual(1, p.parse(st.ParseFileState(io.StringIO(js.example_json)))[0]['id'])
+        self.assertEqual((0, 0), p.cache_info()[:2])
+
+    def test_engine(self):
+        # Deeply nested input doesn't recurse, neither in parsing nor in copying results.
+        deep = '[' * 3000 + '1' + ']' * 3000
+        for mode in ('copy', 'freeze'):
+            p = CachedParser(js.Value(), mode=mode)
+            for i in range(2):
+                r, s = engine.parse(p, st.ps(deep))
+                self.assertTrue(s.finished())
+                for j in range(3000):
+                    r = r[0]
+                self.assertEqual(1, r)
+            self.assertEqual((1, 1), p.cache_info()[:2])
+        # File states are passed through.
+        r, s = engine.parse(p, st.ParseFileState(io.StringIO(js.example_json)))
+        self.assertEqual(['Bar', 'Eek'], r['tags'])
+        r, s = engine.parse(p, st.ps('x'))
+        self.assertEqual((None, 'x'), (r, s.remaining()))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: lbo
+"""
+
+import unittest
+from unittest import mock
+
+import pcombinators.state as st
+from pcombinators.combinators import *
+from pcombinators.primitives import *
+from pcombinators.optimize import optimize
+
+def feed(p, inputs):
+    return [p.parse(st.ps(s))[0] for s in inputs]
+
+class AdaptiveAlternativeTest(unittest.TestCase):
+
+    def setUp(self):
+        self._interval = AdaptiveAlternative.REORDER_INTERVAL
+        AdaptiveAlternative.REORDER_INTERVAL = 10
+
+    def tearDown(self):
+        AdaptiveAlternative.REORDER_INTERVAL = self._interval
+
+    def test_reorder(self):
+        a, b, c = String('a'), String('b'), String('c')
+        p = AdaptiveAlternative(a, b, c)
+        self.assertEqual(['c'] * 20 + ['b'] * 5, feed(p, ['c'] * 20 + ['b'] * 5))
+        self.assertEqual((c, a, b), p._parsers)
+
+    def test_overlapping(self):
+        # Integer and Float both match '1'; they keep their order.
+        integer = Last(Integer() + Skip((Peek(NoneInSet('.eE')) | EndOfInput())))
+        float = Float()
+        p = AdaptiveAlternative(String('x'), integer, float)
+        self.assertEqual([1.5] * 30, feed(p, ['1.5'] * 30))
+        self.assertIs(int, type(feed(p, ['1'])[0]))
+        self.assertEqual((integer, float), p._parsers[1:])
+        # Nullable parsers stay in place.
+        p = AdaptiveAlternative(String('x'), Regex('y*'))
+        feed(p, ['y'] * 20)
+        self.assertEqual('x', p._parsers[0]._s)
+
+    def test_order_independent(self):
+        # Both start with 'a', but can't match the same input.
+        ab, ac = String('ab'), String('ac')
+        p = AdaptiveAlternative(ab, ac)
+        feed(p, ['ac'] * 10)
+        self.assertEqual((ab, ac), p._parsers)
+        p = AdaptiveAlternative(ab, ac, order_independent=True)
+        feed(p, ['ac'] * 10)
+        self.assertEqual((ac, ab), p._parsers)
+
+    def test_optimized(self):
+        a, b, c = String('a'), String('b'), String('c')
+        p = optimize(AdaptiveAlternative(a, b, c))
+        self.assertEqual(['c', 'b', 'a'] * 10, feed(p, ['c', 'b', 'a'] * 10))
+        feed(p, ['c'] * 10)
+        self.assertIs(c, p._parsers[0])
+        self.assertEqual(['a', 'b', 'c', None], feed(p, ['a', 'b', 'c', 'd']))
+
+class DeferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+
+    def record(self, r):
+        self.calls.append(r)
+        return r.upper()
+
+    def test_backtracking(self):
+        word = Regex('[a-z]+').defer(self.record)
+        p = (word + String('!')) | (word + String('?'))
+        r, _ = p.parse(st.ps('abc?'))
+        self.assertEqual([], self.calls)
+        self.assertEqual(['ABC', '?'], force(r))
+        self.assertEqual(['abc'], self.calls)
+
+    def test_nested(self):
+        number = Integer().defer(lambda i: i * 2)
+        pair = (number + Skip(String(',')) + number).defer(tuple)
+        r, _ = (pair >> (lambda p: {'pair': p})).parse(st.ps('1,2'))
+        self.assertEqual({'pair': (2, 4)}, force(r))
+
+    def test_commit(self):
+        word = Regex('[a-z]+').defer(self.record)
+        r, _ = (String('[') + ~(word + String(']'))).parse(st.ps('[abc]'))
+        self.assertEqual(['[', ['ABC', ']']], r)
+        # Results without deferred actions are returned as they are.
+        r = [1, [2, (3, {'a': 4})]]
+        self.assertIs(r, force(r))
+
+    def test_eager_transform(self):
+        # >> receives evaluated results; Skip() and Last() pass them on unevaluated.
+        r, _ = (Integer().defer(abs) >> (lambda x: x + 1)).parse(st.ps('-3'))
+        self.assertEqual(4, r)
+        word = Regex('[a-z]+').defer(self.record)
+        entry = Last(Skip(String('"')) + word + Skip(String('"')))
+        pair = (entry + Skip(String(':')) + entry) >> tuple
+        r, _ = (Repeat(Last(pair + Skip(String(',') | Nothing())), -1) >> dict).parse(st.ps('"a":"b","c":"d"'))
+        self.assertEqual({'A': 'B', 'C': 'D'}, r)
+        r, _ = Last(Skip(String('"')) + word).parse(st.ps('"x'))
+        self.assertEqual(['a', 'b', 'c', 'd'], self.calls)
+        self.assertEqual('X', force(r))
+
+    def test_forced_once(self):
+        # Results without deferred actions aren't searched for them again.
+        word = Regex('[a-z]+').defer(self.record)
+        nested = Lazy(lambda: Last(Skip(String('[')) + ~(Repeat(nested, -1) >> list) + Skip(String(']'))) |
+                              Integer())
+        with mock.patch('pcombinators.combinators.force', wraps=force) as forced:
+            r, _ = (word + nested).parse(st.ps('x[[[1]][2]]'))
+            self.assertEqual(0, forced.call_count)
+            self.assertEqual(['X', [[[1]], [2]]], force(r))
+            # The result list and the deferred action in it.
+            self.assertEqual(2, forced.call_count)
+        self.assertIs(list, type(r[1]))
+
+    def test_iterate(self):
+        word = Regex('[a-z]+,').defer(self.record)
+        self.assertEqual(['A,', 'B,'], list(word.iterate(st.ps('a,b,'))))
+
+if __name__ == '__main__':
+    unittest.main()
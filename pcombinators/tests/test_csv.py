@@ -6,6 +6,7 @@ Created on Sat May 25 23:58:21 2019
 @author: lbo
 """
 
+import array
 import io
 import unittest
 
@@ -41,6 +42,60 @@ class CSVTest(unittest.TestCase):
         self.assertEqual(want, file(csv_in))
         self.assertEqual(want, csv.file.parse(st.ParseFileState(io.StringIO(csv_in)))[0])
 
+    def test_records(self):
+        csv_in = '"title1", "title2", "title3"\n\n1, 2, "aaa"\n"12", 4, "bbb"\n'
+        self.assertEqual(file(csv_in), list(csv.records(st.ps(csv_in))))
+        s = st.ParseFileState(io.StringIO('1, 2.5, "abc"\n' * 2000))
+        n = 0
+        for r in csv.records(s):
+            self.assertEqual([1, 2.5, 'abc'], r)
+            # Consumed input is dropped.
+            self.assertTrue(len(s._buf) < 2 * (st.ParseFileState.COLLECT_LOWER_LIMIT + s.PREFILL))
+            n += 1
+        self.assertEqual(2000, n)
+        self.assertTrue(s.finished())
+
+    def test_columns(self):
+        csv_in = '"a", "b", "c"\n1, 2, "xyz"\n\n3, 4.5, "w"\n5, 6, "uv"'
+        cols = csv.parse_columns(st.ps(csv_in), header=True)
+        self.assertEqual(['a', 'b', 'c'], cols.names)
+        self.assertEqual(3, len(cols))
+        self.assertEqual(array.array('q', [1, 3, 5]), cols['a'])
+        # Promoted to float when 4.5 appeared.
+        self.assertEqual(array.array('d', [2., 4.5, 6.]), cols['b'])
+        self.assertEqual(['xyz', 'w', 'uv'], list(cols['c']))
+        self.assertEqual('uv', cols['c'][-1])
+        self.assertEqual('xyzwuv', cols['c'].data())
+        cols = csv.parse_columns(st.ps('1, 2\n3, 4\n'), schema=[float, int])
+        self.assertEqual(array.array('d', [1., 3.]), cols[0])
+        self.assertRaises(ValueError, csv.parse_columns, st.ps('1, 2\n3, "x"\n'))
+
+    def test_columns_schema_mismatch(self):
+        # An explicit schema isn't changed by promotion.
+        self.assertRaises(ValueError, csv.parse_columns, st.ps('1, 2\n3, 4.5\n'), schema=[int, int])
+        cols = csv.parse_columns(st.ps('1, 2\n3, 4.5\n'), schema=[int, float])
+        self.assertEqual([int, float], cols.types)
+
+    def test_columns_overflow(self):
+        csv_in = '1, 2\n100000000000000000000, 3\n'
+        cols = csv.parse_columns(st.ps(csv_in))
+        self.assertEqual(array.array('d', [1., 1e20]), cols[0])
+        self.assertEqual([float, int], cols.types)
+        self.assertRaises(ValueError, csv.parse_columns, st.ps(csv_in), schema=[int, int])
+
+    def test_columns_malformed(self):
+        with self.assertRaises(ValueError) as cm:
+            csv.parse_columns(st.ps('1, 2\n3, x\n5, 6\n'))
+        self.assertIn('position 5', str(cm.exception))
+        with self.assertRaises(ValueError):
+            csv.parse_columns(st.ParseFileState(io.StringIO('1, 2\n3, x\n5, 6\n')))
+
+    @unittest.skipIf(csv.numpy is None, 'numpy not installed')
+    def test_columns_numpy(self):
+        a, b = csv.parse_columns(st.ps('1, 2.5\n3, 4\n')).to_numpy()
+        self.assertEqual([1, 3], list(a))
+        self.assertEqual([2.5, 4.], list(b))
+
 if __name__ == '__main__':
     st.ParseFileState.COLLECT_LOWER_LIMIT = 0
     unittest.main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: lbo
+"""
+
+import io
+import unittest
+
+import pcombinators.engine as engine
+import pcombinators.state as st
+import pcombinators.tests.arith as arith
+import pcombinators.tests.csv as csv
+import pcombinators.tests.json as js
+import pcombinators.tests.test_arith as test_arith
+import pcombinators.tests.test_cache as test_cache
+import pcombinators.tests.test_combinators as test_combinators
+import pcombinators.tests.test_csv as test_csv
+import pcombinators.tests.test_json as test_json
+import pcombinators.tests.test_primitives as test_primitives
+import pcombinators.tests.test_state as test_state
+from pcombinators.combinators import Parser
+from pcombinators.primitives import EndOfInput
+
+def _subclasses(cls):
+    for c in cls.__subclasses__():
+        yield c
+        yield from _subclasses(c)
+
+def _engine_parse(self, st):
+    return engine.parse(self, st)
+
+class EngineTest(unittest.TestCase):
+
+    def assertSameResult(self, parser, text):
+        want, st1 = parser.parse(st.ps(text))
+        got, st2 = engine.parse(parser, st.ps(text))
+        self.assertEqual(want, got)
+        self.assertEqual(st1.index(), st2.index())
+        got, _ = engine.parse(parser, st.ParseFileState(io.StringIO(text)))
+        self.assertEqual(want, got)
+
+    def test_examples(self):
+        self.assertSameResult(js.Value(), js.example_json)
+        self.assertSameResult(js.Value(), '[{"a":[1,2]},3,"x",[]]')
+        self.assertSameResult(csv.file, '"title1", "title2"\n\n1, 2.5, "aaa"\n"12", 4, "bbb"\n')
+        term = arith.Term().then_skip(EndOfInput())
+        for e in ['1+1', '3*4*(a-(b-(c-d))*4)^a^c', 'a+b^(c-d/e)*(3-(4+a)+6^-1)', '1+(a+)']:
+            self.assertSameResult(term, e)
+
+    def test_deep_nesting(self):
+        depth = 5000
+        text = '[' * depth + '1' + ']' * depth
+        self.assertRaises(RecursionError, js.Value().parse, st.ps(text))
+        r, s = engine.parse(js.Value(), st.ps(text))
+        self.assertTrue(s.finished())
+        for i in range(depth):
+            self.assertEqual(len(r), 1)
+            r = r[0]
+        self.assertEqual(r, 1.)
+
+class ExampleSuitesTest(unittest.TestCase):
+    """Runs the example test suites with every parser implementing _steps() parsing
+    through the engine, so that _steps() and parse() can't drift apart."""
+
+    SUITES = [test_arith, test_cache, test_combinators, test_csv, test_json, test_primitives,
+              test_state]
+
+    def test_suites(self):
+        patched = [c for c in _subclasses(Parser) if c._steps is not None and 'parse' in vars(c)]
+        self.assertTrue(patched)
+        originals = [c.parse for c in patched]
+        try:
+            for c in patched:
+                c.parse = _engine_parse
+            for module in self.SUITES:
+                result = unittest.TestResult()
+                unittest.defaultTestLoader.loadTestsFromModule(module).run(result)
+                problems = ['{}: {}'.format(t, tb) for (t, tb) in result.failures + result.errors]
+                self.assertEqual([], problems)
+                self.assertTrue(result.testsRun > 0)
+        finally:
+            for c, parse in zip(patched, originals):
+                c.parse = parse
+
+if __name__ == '__main__':
+    st.ParseFileState.COLLECT_LOWER_LIMIT = 0
+    unittest.main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: lbo
+"""
+
+import random
+import unittest
+
+import pcombinators.state as st
+import pcombinators.tests.arith as arith
+import pcombinators.tests.json as js
+from pcombinators.incremental import parse_incremental, reparse
+from pcombinators.primitives import EndOfInput
+
+class IncrementalTest(unittest.TestCase):
+
+    def assertFreshParse(self, tree):
+        self.assertEqual(tree.value, tree.parser.parse(st.ps(tree.text))[0])
+
+    def test_json(self):
+        text = '[' + ','.join('{{"k{}":[{},"v"]}}'.format(i, i) for i in range(300)) + ']'
+        tree = parse_incremental(js.Value(), text)
+        self.assertEqual(tree.value[12], {'k12': [12, 'v']})
+        self.assertEqual(tree.hits, 0)
+        full = tree.misses
+        i = text.index('[150,') + 1
+        tree = reparse(tree, [(i, i+3, '-1.5')])
+        self.assertEqual(tree.value[150], {'k150': [-1.5, 'v']})
+        self.assertFreshParse(tree)
+        self.assertTrue(tree.misses < full / 10)
+        # Edits are relative to the text of the tree they are applied to.
+        tree = reparse(tree, [(0, 1, ''), (len(tree.text)-1, len(tree.text), '')])
+        self.assertEqual(tree.value, {'k0': [0, 'v']})
+        self.assertFreshParse(tree)
+        tree = reparse(tree, [(0, 0, '['), (len(tree.text), len(tree.text), ',7]')])
+        self.assertEqual(tree.value[-1], 7)
+        self.assertFreshParse(tree)
+
+    def test_random_edits(self):
+        rng = random.Random(1)
+        term = arith.Term().then_skip(EndOfInput())
+        tree = parse_incremental(term, '1+2*(a-b)^3/c+(4-d)')
+        for i in range(50):
+            start = rng.randint(0, len(tree.text))
+            end = min(len(tree.text), start + rng.randint(0, 2))
+            tree = reparse(tree, [(start, end, rng.choice(['', '1', 'x', '+', '(', ')', '*2']))])
+            self.assertFreshParse(tree)
+
+if __name__ == '__main__':
+    unittest.main()
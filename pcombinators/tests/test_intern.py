@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: lbo
+"""
+
+import unittest
+
+import pcombinators.state as st
+import pcombinators.tests.arith as arith
+import pcombinators.tests.json as js
+from pcombinators.analysis import Grammar
+from pcombinators.combinators import *
+from pcombinators.primitives import *
+from pcombinators.intern import intern
+
+def add(n):
+    return lambda x: x + n
+
+class InternTest(unittest.TestCase):
+
+    def test_shared(self):
+        p = intern(Whitespace() + String('a') + Whitespace())
+        self.assertIs(p._parsers[0], p._parsers[2])
+        self.assertEqual(['', 'a', ''], p.parse(st.ps('a'))[0])
+
+    def test_distinct(self):
+        p = intern(String('a') + String('b') + String('a').named('other'))
+        self.assertEqual(3, len(set(map(id, p._parsers))))
+        # Functions are equal if their code and closures are.
+        comma = Skip(String(','))
+        p = intern((Integer() >> add(1)) + comma + (Integer() >> add(2)) + comma + (Integer() >> add(1)))
+        self.assertIsNot(p._parsers[0], p._parsers[2])
+        self.assertIs(p._parsers[0], p._parsers[4])
+        self.assertEqual([2, 4, 4], p.parse(st.ps('1,2,3'))[0])
+
+    def test_recursive(self):
+        # Every Parens() builds a new Term(); interned, they are all the same.
+        term = intern(arith.Term())
+        self.assertTrue(len(Grammar(term).parsers()) < len(Grammar(arith.Term()).parsers()))
+        terms = [p for p in Grammar(term).parsers() if isinstance(p, arith.Term)]
+        self.assertEqual([term], terms)
+        self.assertEqual(arith.parse('1+(2*(3-a))^2'), term.parse(st.ps('1+(2*(3-a))^2'))[0])
+
+    def test_json(self):
+        self.assertEqual(js.Value().parse(st.ps(js.example_json))[0]['tags'], ['Bar', 'Eek'])
+        values = [p for p in Grammar(js._value).parsers() if isinstance(p, js.Value)]
+        self.assertEqual(1, len(values))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -26,11 +26,33 @@ class JSONTest(unittest.TestCase):
         self.assertEqual([{"a": [1, 2]}, 3], js.json_result('[{"a": [1,2]}, 3]'))
         self.assertEqual({"a": {"b": {"c": [1,2]}}}, js.json_result('{"a": {"b": {"c": [1,2]}}}'))
         
+    def test_empty_structs(self):
+        self.assertEqual([], js.json_result('[]'))
+        self.assertEqual({'a': {}}, js.json_result('{"a": {}}'))
+
+    def test_commit(self):
+        self.assertRaises(st.CommitError, js.json_result, '[1, 2')
+        self.assertRaises(st.CommitError, js.json_result, '{"a": 1,]')
+
+    def test_stream_buffer_collected(self):
+        have = '[' + '1,' * 3000 + '1]'
+        s = st.ParseFileState(io.StringIO(have))
+        self.assertEqual([1] * 3001, js.json_result(s))
+        # Committing dropped the outer holds, so the beginning of the input is gone.
+        self.assertTrue(s._total_offset > 0)
+
     def test_stream_parse(self):
         have = '{"id":1,"name":"Foo","price":123,"tags":["Bar","Eek"],"stock":{"warehouse":300,"retail":20}}'
         want = {"id":1,"name":"Foo","price":123,"tags":["Bar","Eek"],"stock":{"warehouse":300,"retail":20}}
         self.assertEqual(want, js.json_result(st.ParseFileState(io.StringIO(have))))
 
+    def test_file(self):
+        have = '{\n  "name": "Foo Bar",\n  "tags": [ "a b", "c" ],\n  "stock": { "n": 3 }\n}\n'
+        want = {"name": "Foo Bar", "tags": ["a b", "c"], "stock": {"n": 3}}
+        self.assertEqual(want, js.parse_json_file(io.StringIO(have))[0])
+        have = '[' + ' 1 ,\n' * 3000 + '1 ]'
+        self.assertEqual([1] * 3001, js.parse_json_file(io.StringIO(have))[0])
+
 if __name__ == '__main__':
     st.ParseFileState.COLLECT_LOWER_LIMIT = 0
     unittest.main()
\ No newline at end of file
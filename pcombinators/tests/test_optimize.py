@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: lbo
+"""
+
+import os
+import tempfile
+import timeit
+import unittest
+
+import pcombinators.state as st
+import pcombinators.tests.arith as arith
+import pcombinators.tests.csv as csv
+import pcombinators.tests.json as js
+from pcombinators.combinators import *
+from pcombinators.primitives import *
+from pcombinators.optimize import optimize, grammar_key
+
+class OptimizeTest(unittest.TestCase):
+
+    def test_dispatch(self):
+        p = FirstAlternative(String('ab') >> (lambda s: 1), Regex('[a-z]+'), Float() >> int)
+        optimize(p)
+        self.assertEqual(p.parse(st.ps('ab'))[0], 1)
+        self.assertEqual(p.parse(st.ps('ac'))[0], 'ac')
+        self.assertEqual(p.parse(st.ps('-1.5'))[0], -1)
+        self.assertIsNone(p.parse(st.ps('?'))[0])
+        self.assertEqual(p._dispatch['?'], ())
+
+    def test_examples(self):
+        want = js.json_result(js.example_json)
+        optimize(js.Value())
+        self.assertEqual(want, js.json_result(js.example_json))
+        csv_in = '"title1", "title2", "title3"\n\n1, 2, "aaa"\n"12", 4.5, "bbb"\n'
+        want = csv.file.parse(st.ps(csv_in))[0]
+        optimize(csv.file)
+        self.assertEqual(want, csv.file.parse(st.ps(csv_in))[0])
+        term = arith.Term()
+        want = term.parse(st.ps('a+b^(c-d/e)*(3-(4+a)+6^-1)'))[0]
+        optimize(term)
+        self.assertEqual(want, term.parse(st.ps('a+b^(c-d/e)*(3-(4+a)+6^-1)'))[0])
+
+    def test_all_instances(self):
+        # Every Parens() builds a new Term(); all copies get dispatch tables.
+        term = optimize(arith.Term())
+        self.assertEqual(arith.parse('1+(2*(3-a))^2'), term.parse(st.ps('1+(2*(3-a))^2'))[0])
+        # Walk all instances, without resolving Lazy parsers the parse didn't reach.
+        seen, queue, alternatives = set(), [term], []
+        while queue:
+            p = queue.pop()
+            if p is None or id(p) in seen:
+                continue
+            seen.add(id(p))
+            if isinstance(p, FirstAlternative):
+                alternatives.append(p)
+            queue.extend([p._parser] if isinstance(p, Lazy) else p.children())
+        self.assertTrue(alternatives)
+        self.assertEqual([], [a for a in alternatives if a._guards is None])
+
+    def test_cache(self):
+        def grammar(fn=lambda l: l):
+            return (String('[') + Float() + String(']')) >> fn | Integer()
+        with tempfile.TemporaryDirectory() as d:
+            optimize(grammar(), d)
+            self.assertEqual(len(os.listdir(d)), 1)
+            # A new, structurally equal grammar uses the cached tables.
+            p = optimize(grammar(), d)
+            self.assertEqual(len(os.listdir(d)), 1)
+            self.assertIsNotNone(p._guards)
+            self.assertEqual(p.parse(st.ps('[1]'))[0], ['[', 1., ']'])
+        self.assertEqual(grammar_key(grammar()), grammar_key(grammar()))
+        self.assertNotEqual(grammar_key(grammar()), grammar_key(grammar(lambda l: l[1])))
+
+    def test_cache_faster(self):
+        # Loading the tables for a freshly built grammar beats computing them.
+        def best(f):
+            return min(timeit.repeat(f, number=10, repeat=5))
+        with tempfile.TemporaryDirectory() as d:
+            optimize(arith.Term(), d)
+            cached = best(lambda: optimize(arith.Term(), d))
+            uncached = best(lambda: optimize(arith.Term()))
+        self.assertLess(cached, uncached * .5)
+
+if __name__ == '__main__':
+    unittest.main()
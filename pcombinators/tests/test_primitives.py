@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: lbo
+"""
+
+import array
+import decimal
+import io
+import unittest
+
+import pcombinators.state as st
+from pcombinators.primitives import *
+
+def parse(p, s):
+    state = st.ps(s)
+    result, state = p.parse(state)
+    return result, state.remaining()
+
+class NumberTest(unittest.TestCase):
+
+    def test_float(self):
+        self.assertEqual((1.5, ''), parse(Float(), '1.5'))
+        self.assertEqual((-1500.0, 'x'), parse(Float(), '-1.5e3x'))
+        self.assertEqual((12.0, ''), parse(Float(), '+12'))
+        self.assertEqual((1000.25, ''), parse(Float(), '1_000.25'))
+        self.assertEqual((1.0, 'e+x'), parse(Float(), '1e+x'))
+        self.assertEqual((1.0, '.'), parse(Float(), '1.'))
+        self.assertEqual((None, '-x'), parse(Float(), '-x'))
+
+    def test_exact(self):
+        self.assertEqual((decimal.Decimal('0.1'), ''), parse(Float(exact=True), '0.1'))
+
+    def test_integer(self):
+        self.assertEqual((-12, ''), parse(Integer(), '-12'))
+        self.assertEqual((255, ''), parse(Integer(), '0xff'))
+        self.assertEqual((-255, ''), parse(Integer(), '-0x_f_f'))
+        self.assertEqual((8, ''), parse(Integer(), '0o10'))
+        self.assertEqual((5, ''), parse(Integer(), '0b101'))
+        self.assertEqual((1000000, ''), parse(Integer(), '1_000_000'))
+        self.assertEqual((0, 'xg'), parse(Integer(), '0xg'))
+        self.assertEqual((7, ''), parse(Integer(), '007'))
+
+    def test_number_list(self):
+        result, rest = parse(NumberList(), '1, 2.5 ,-3e2,x')
+        self.assertEqual((array.array('d', [1, 2.5, -300]), ',x'), (result, rest))
+        result, rest = parse(NumberList(';', 'q'), '1;2;3;')
+        self.assertEqual((array.array('q', [1, 2, 3]), ';'), (result, rest))
+        self.assertEqual((None, 'x'), parse(NumberList(), 'x'))
+
+    def test_number_list_overflow(self):
+        self.assertEqual((None, '1000'), parse(NumberList(',', 'b'), '1000'))
+
+    def test_file_state(self):
+        # Literals and lists longer than the buffer window.
+        s = st.ParseFileState(io.StringIO('1' * 1000 + ',2'))
+        self.assertEqual(int('1' * 1000), Integer().parse(s)[0])
+        s = st.ParseFileState(io.StringIO(','.join(['1.5'] * 2000) + ' x'))
+        result, s = NumberList().parse(s)
+        self.assertEqual(2000, len(result))
+        self.assertEqual(' x', s.remaining())
+
+class RegexTest(unittest.TestCase):
+
+    def test_anchors_at_offset(self):
+        # The current position is the start of the input for the expression.
+        self.assertEqual(['x', 'abc'], (String('x') + Regex('^abc')).parse(st.ps('xabc'))[0])
+        self.assertEqual(['x', 'foo'], (String('x') + Regex(r'\bfoo')).parse(st.ps('xfoo'))[0])
+        self.assertEqual(['x', 'a'], (String('x') + Regex('(?<!x)a')).parse(st.ps('xa'))[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: lbo
+"""
+
+import unittest
+
+import pcombinators.state as st
+import pcombinators.tests.json as js
+from pcombinators.combinators import *
+from pcombinators.primitives import *
+from pcombinators.profile import Profiler, StackTracer
+
+class ProfileTest(unittest.TestCase):
+
+    def test_counters(self):
+        ab = (String('a') + String('b')).named('ab')
+        ac = (String('a') + String('c')).named('ac')
+        p = Repeat(ab | ac, -1)
+        prof = Profiler()
+        r, _ = prof.run(p, st.ps('abacab'))
+        self.assertEqual(r, [['a', 'b'], ['a', 'c'], ['a', 'b']])
+        stats = {s.parser._name: s for s in prof.stats.values() if s.parser._name}
+        self.assertEqual(stats['ab'].calls, 4)
+        self.assertEqual(stats['ab'].successes, 2)
+        self.assertEqual(stats['ab'].failures, 2)
+        self.assertEqual(stats['ab'].consumed, 4)
+        # 'a' of "ac" is consumed by ab and then reset.
+        self.assertEqual(stats['ab'].backtracked, 1)
+        self.assertEqual(stats['ac'].calls, 2)
+        self.assertEqual(stats['ac'].successes, 1)
+        self.assertIn('ab', prof.report())
+
+    def test_uninstall(self):
+        prof = Profiler()
+        self.assertEqual(prof.run(js.Value(), st.ps(js.example_json))[0]['id'], 1)
+        self.assertTrue(len(prof.stats) > 10)
+        for s in prof.stats:
+            self.assertNotIn('parse', vars(s))
+
+    def test_collapsed_stacks(self):
+        tracer = StackTracer()
+        tracer.run(js.Value(), st.ps('[[1],2]'))
+        stacks = [l.rsplit(' ', 1)[0] for l in tracer.collapsed()]
+        # Value recurses through lists; the Lazy wrapper itself is not shown.
+        self.assertTrue(any(s.endswith(';List;AtomicSequence;Commit;_Transform;Repeat;list_entry;AtomicSequence;Value') for s in stacks))
+        self.assertTrue(any(s.count('Value') == 3 and s.endswith(';Float') for s in stacks))
+        self.assertFalse(any('Lazy' in s for s in stacks))
+        self.assertNotIn('parse', vars(js.Value))
+
+if __name__ == '__main__':
+    unittest.main()
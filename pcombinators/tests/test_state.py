@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: lbo
+"""
+
+import io
+import unittest
+
+import pcombinators.state as st
+import pcombinators.tests.json as js
+from pcombinators.combinators import *
+from pcombinators.primitives import *
+
+# Exponential backtracking on input like 'aaaa...a'.
+exponential = Lazy(lambda: (String('a') + exponential + String('b')) |
+                           (String('a') + exponential + String('c')) |
+                           String('a'))
+
+class BudgetTest(unittest.TestCase):
+
+    def test_steps(self):
+        s = st.ps('a' * 40).set_budget(max_steps=5000)
+        with self.assertRaises(st.ParseBudgetExceeded) as cm:
+            (exponential + EndOfInput()).parse(s)
+        self.assertTrue(5000 < cm.exception.steps <= 5000 + st._Budget.CHECK_INTERVAL)
+        self.assertTrue(0 < cm.exception.furthest <= 40)
+
+    def test_timeout(self):
+        s = st.ParseFileState(io.StringIO('a' * 40)).set_budget(timeout=.05)
+        with self.assertRaises(st.ParseBudgetExceeded) as cm:
+            exponential.parse(s)
+        self.assertTrue(cm.exception.elapsed >= .05)
+
+    def test_within_budget(self):
+        s = st.ps(js.example_json).set_budget(max_steps=10000, timeout=10)
+        self.assertEqual(js.Value().parse(s)[0]['id'], 1)
+        s.set_budget()
+        self.assertNotIn('hold', vars(s))
+
+class WindowTest(unittest.TestCase):
+
+    def test_window(self):
+        s = st.ps('{"expr":"1+2*x","n":12345}')
+        w = s.window(9, 14)
+        self.assertIs(s._input, w._input)
+        self.assertEqual((9, '1+2*x'), (w.index(), w.remaining()))
+        r, w = (Float() + String('+') + Float()).parse(w)
+        self.assertEqual([1.0, '+', 2.0], r)
+        self.assertEqual(('*x', 12), (w.remaining(), w.index()))
+        self.assertEqual('*x', Regex('.*').parse(w)[0])
+        self.assertTrue(w.finished())
+        self.assertEqual((None, None), (w.peek(), w.next()))
+        # Numbers stop at the window end.
+        self.assertEqual(123, Integer().parse(s.window(20, 23))[0])
+        self.assertEqual(0, s.index())
+
+    def test_bounds(self):
+        s = st.ps('abc')
+        self.assertEqual('', s.window(3).remaining())
+        self.assertEqual('b', s.window(1, 2).window(1).remaining())
+        with self.assertRaises(ValueError):
+            s.window(1, 4)
+        with self.assertRaises(ValueError):
+            s.window(1, 2).window(0)
+        with self.assertRaises(NotImplementedError):
+            st.ParseFileState(io.StringIO('abc')).window(0, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: lbo
+"""
+
+import io
+import unittest
+
+import pcombinators.util as ut
+
+def filtered(s, chunk=ut.WhitespaceFilter.CHUNK, **kwargs):
+    f = ut.WhitespaceFilter(io.StringIO(s), **kwargs)
+    f.CHUNK = chunk
+    return ''.join(iter(lambda: f.read(3), ''))
+
+class WhitespaceFilterTest(unittest.TestCase):
+
+    def test_strings(self):
+        self.assertEqual('{"a b":[1,2],"c\\" d":"x"}',
+                         ut.remove_unused_whitespace('{ "a b" : [1, 2],\n "c\\" d": "x" }'))
+        self.assertEqual("f('a b',\"c d\")", filtered("f( 'a b', \"c d\" )", quotes='\'"'))
+        self.assertEqual('"a\\"b', filtered(' "a\\"b ', escape=None))
+        # Unterminated strings are kept as they are.
+        self.assertEqual('1"a b ', filtered(' 1 "a b '))
+
+    def test_comments(self):
+        s = '{ "a": 1, // one "\n  "b": "#//" # two\n}/'
+        self.assertEqual('{"a":1,"b":"#//"}/', filtered(s, comments=('//', '#')))
+        self.assertEqual('1//x#y', filtered('1 // x # y'))
+
+    def test_chunks(self):
+        s = '{ "a b": [1, 2], // c"d\n "e\\" f": "x y" # g\n "h i'
+        want = filtered(s, comments=('//', '#'))
+        self.assertEqual('{"a b":[1,2],"e\\" f":"x y""h i', want)
+        for n in range(1, 12):
+            self.assertEqual(want, filtered(s, chunk=n, comments=('//', '#')))
+
+if __name__ == '__main__':
+    unittest.main()
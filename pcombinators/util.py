@@ -6,6 +6,8 @@ Created on Thu May 23 22:34:33 2019
 @author: lbo
 """
 
+import io
+import re
 import time
 
 def time_it(f):
@@ -16,14 +18,91 @@ def time_it(f):
         return r
     return f_
 
+class WhitespaceFilter(io.TextIOBase):
+    """A readable text stream returning the contents of the text stream f without
+    whitespace, except in strings. Optionally, line comments are removed too.
+
+    Wrap files in it before passing them to ParseFileState, so that grammars don't
+    need to parse whitespace. The input is processed in chunks with a compiled
+    regular expression.
+
+    quotes are the characters starting and ending strings; escape (or None) is the
+    character preceding quotes that don't end a string; comments are markers like '//'
+    or '#' starting comments that extend to the end of the line.
+
+    Example:
+        ParseFileState(WhitespaceFilter(open('data.json'), comments=('//',)))
+    """
+
+    # Characters read from f at once.
+    CHUNK = 65536
+
+    def __init__(self, f, quotes='"', escape='\\', comments=(), whitespace=' \n\t\r'):
+        self._f = f
+        self._eof = False
+        # Input that may belong to a token continuing in the next chunk.
+        self._pending = ''
+        self._out = ''
+        self._pos = 0
+        self._comments = tuple(comments)
+        strings, unterminated = [], []
+        for q in quotes:
+            q = re.escape(q)
+            if escape:
+                e = re.escape(escape)
+                body = '[^{q}{e}]*(?:{e}.[^{q}{e}]*)*'.format(q=q, e=e)
+                strings.append(q + body + q)
+                unterminated.append(q + body + e + '?\\Z')
+            else:
+                strings.append('{q}[^{q}]*{q}'.format(q=q))
+                unterminated.append('{q}[^{q}]*\\Z'.format(q=q))
+        # Comments, and beginnings of comment markers, at the end of the input.
+        unterminated.extend(re.escape(c) + '[^\\n]*\\Z' for c in comments)
+        unterminated.extend(re.escape(c[:i]) + '\\Z' for c in comments for i in range(1, len(c)))
+        # split() returns the parts between matches, strings and unterminated tokens.
+        # Comments are matched, but not returned.
+        self._rx = re.compile('({})|({}){}'.format(
+            '|'.join(strings), '|'.join(unterminated),
+            ''.join('|' + re.escape(c) + '[^\\n]*' for c in comments)), re.DOTALL)
+        self._whitespace = {ord(c): None for c in whitespace}
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while not self._eof and (size is None or size < 0 or len(self._out) - self._pos < size):
+            self._fill()
+        if size is None or size < 0:
+            size = len(self._out) - self._pos
+        result = self._out[self._pos:self._pos+size]
+        self._pos += len(result)
+        return result
+
+    def _fill(self):
+        chunk = self._f.read(self.CHUNK)
+        if not chunk:
+            self._eof = True
+        parts = self._rx.split(self._pending + chunk)
+        self._pending = ''
+        # Only the last match can be an unterminated token.
+        tail = parts[-2] if len(parts) > 1 else None
+        if tail is not None:
+            if not self._eof:
+                # Process it again together with the next chunk.
+                self._pending = tail
+                parts[-2] = None
+            elif tail.startswith(self._comments):
+                parts[-2] = None
+        # Remove whitespace from the parts outside of strings and comments at once.
+        outside = parts[0::3]
+        joined = '\0'.join(outside)
+        if joined.count('\0') == len(outside) - 1:
+            parts[0::3] = joined.translate(self._whitespace).split('\0')
+        else:
+            parts[0::3] = [p.translate(self._whitespace) for p in outside]
+        self._out = self._out[self._pos:] + ''.join(filter(None, parts))
+        self._pos = 0
+
 def remove_unused_whitespace(s):
-    acc = []
-    lvl = 0
-    ws = set(' \n\t\r')
-    for c in s:
-        if c == '"':
-            lvl += 1 if lvl == 0 else -1
-        if lvl == 0 and c in ws:
-            continue
-        acc.append(c)
-    return ''.join(acc)
+    """Remove whitespace outside of strings from s."""
+    return WhitespaceFilter(io.StringIO(s)).read()